@@ -0,0 +1,160 @@
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailySales, Order, Product, ProductSales
+
+OrderLine = Order.products.through
+
+
+class SalesDelta:
+    """Accumulates changes to DailySales and ProductSales and applies them with F() updates."""
+
+    def __init__(self):
+        self.daily = defaultdict(lambda: [0, Decimal('0.00')])
+        self.units = defaultdict(int)
+
+    def add(self, status, day, orders=0, revenue=0, product_id=None, units=0):
+        entry = self.daily[status, day]
+        entry[0] += orders
+        entry[1] += revenue or 0
+        if product_id is not None:
+            self.units[product_id] += units
+
+    def add_orders(self, rows, sign):
+        for row in rows:
+            self.add(row['status'], row['day'], orders=sign * row['orders'])
+
+    def add_revenue(self, rows, sign):
+        for row in rows:
+            self.add(row['status'], row['day'], revenue=sign * (row['revenue'] or 0))
+
+    def add_units(self, rows, sign):
+        for row in rows:
+            self.units[row['product_id']] += sign * row['units']
+
+    def apply(self, using):
+        """Writes the changes once the current transaction commits."""
+        daily = {key: value for key, value in self.daily.items() if any(value)}
+        units = {pk: value for pk, value in self.units.items() if value}
+        if not (daily or units):
+            return
+        # Concurrent orders of one status and day all increment the same
+        # DailySales row; updating it inside their transactions would make
+        # each wait for the others to commit. A write lost to a crash after
+        # commit is repaired by rebuild_sales_aggregates.
+        transaction.on_commit(partial(self.write, daily, units, using), using=using, robust=True)
+
+    @staticmethod
+    def write(daily, units, using):
+        with transaction.atomic(using=using):
+            # Missing rows are created empty first so every change is an
+            # increment, which stays correct under concurrent writers.
+            DailySales.objects.using(using).bulk_create(
+                [DailySales(status=status, day=day) for status, day in daily], ignore_conflicts=True
+            )
+            for (status, day), (orders, revenue) in daily.items():
+                DailySales.objects.using(using).filter(status=status, day=day).update(
+                    orders=F('orders') + orders, revenue=F('revenue') + revenue
+                )
+            # Only sales can need a new row; the product of a removal may
+            # have been deleted, with its row, by the time this runs.
+            ProductSales.objects.using(using).bulk_create(
+                [ProductSales(product_id=pk) for pk, value in units.items() if value > 0], ignore_conflicts=True
+            )
+            by_value = defaultdict(list)
+            for pk, value in units.items():
+                by_value[value].append(pk)
+            for value, pks in by_value.items():
+                ProductSales.objects.using(using).filter(product_id__in=pks).update(units=F('units') + value)
+
+
+def order_counts(orders):
+    return orders.annotate(day=TruncDate('date')).values('status', 'day').annotate(orders=Count('pk')).order_by()
+
+
+def line_revenue(lines):
+    return (
+        lines.annotate(status=F('order__status'), day=TruncDate('order__date'))
+        .values('status', 'day').annotate(revenue=Sum('product__price')).order_by()
+    )
+
+
+def line_units(lines):
+    return lines.values('product_id').annotate(units=Count('pk')).order_by()
+
+
+def apply_orders(order_ids, sign, using):
+    """Adds (sign=1) or removes (sign=-1) whole orders, with their lines, as currently stored."""
+    if not order_ids:
+        return
+    lines = OrderLine.objects.using(using).filter(order_id__in=order_ids)
+    delta = SalesDelta()
+    delta.add_orders(order_counts(Order.objects.using(using).filter(pk__in=order_ids)), sign)
+    delta.add_revenue(line_revenue(lines), sign)
+    delta.add_units(line_units(lines), sign)
+    delta.apply(using)
+
+
+def add_new_orders(orders, using):
+    """Counts orders that were just created and have no lines yet."""
+    delta = SalesDelta()
+    for order in orders:
+        delta.add(order.status, timezone.localdate(order.date), orders=1)
+    delta.apply(using)
+
+
+def apply_product_lines(product_ids, sign, using):
+    """Adds or removes every order line of the given products at their stored price."""
+    if not product_ids:
+        return
+    lines = OrderLine.objects.using(using).filter(product_id__in=product_ids)
+    delta = SalesDelta()
+    delta.add_revenue(line_revenue(lines), sign)
+    delta.add_units(line_units(lines), sign)
+    delta.apply(using)
+
+
+def apply_lines(pairs, sign, using):
+    """Adds or removes (order_id, product_id) lines, whether or not they are stored yet."""
+    if not pairs:
+        return
+    orders = {
+        row['pk']: (row['status'], row['day'])
+        for row in Order.objects.using(using).filter(pk__in={order_id for order_id, _ in pairs})
+        .annotate(day=TruncDate('date')).values('pk', 'status', 'day')
+    }
+    prices = dict(
+        Product.objects.using(using).filter(pk__in={product_id for _, product_id in pairs}).values_list('pk', 'price')
+    )
+    delta = SalesDelta()
+    for order_id, product_id in pairs:
+        if order_id not in orders or product_id not in prices:
+            continue
+        status, day = orders[order_id]
+        delta.add(status, day, revenue=sign * prices[product_id], product_id=product_id, units=sign)
+    delta.apply(using)
+
+
+def rebuild_sales_aggregates(using):
+    """Recomputes both summary tables from the orders, fixing any drift."""
+    delta = SalesDelta()
+    lines = OrderLine.objects.using(using).all()
+    delta.add_orders(order_counts(Order.objects.using(using).all()), 1)
+    delta.add_revenue(line_revenue(lines), 1)
+    delta.add_units(line_units(lines), 1)
+    with transaction.atomic(using=using):
+        DailySales.objects.using(using).all().delete()
+        ProductSales.objects.using(using).all().delete()
+        DailySales.objects.using(using).bulk_create([
+            DailySales(status=status, day=day, orders=orders, revenue=revenue)
+            for (status, day), (orders, revenue) in delta.daily.items()
+        ], batch_size=1000)
+        ProductSales.objects.using(using).bulk_create([
+            ProductSales(product_id=pk, units=units) for pk, units in delta.units.items()
+        ], batch_size=1000)
+    return len(delta.daily), len(delta.units)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class Lab4Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Lab4'
+
+    def ready(self):
+        from . import db, jobs, signals  # noqa: F401
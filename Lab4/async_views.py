@@ -0,0 +1,163 @@
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import (
+    APIException, NotAuthenticated, NotFound, PermissionDenied, Throttled, ValidationError,
+)
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from .authentication import CachedJWTAuthentication
+from .models import Product, Customer, Order
+from .pagination import keyset_filter
+from .permissions import IsAdminOrReadOnly
+from .serializers import ProductSerializer, CustomerSerializer, OrderSerializer
+
+
+class AsyncReadView(View):
+    """
+    Read-only list/retrieve endpoint served by the async ORM. Pages are
+    keyset-paginated on `ordering` with an opaque `?cursor=`. Requests are
+    throttled like the viewset with the same `basename`, sharing its buckets.
+    """
+    http_method_names = ['get', 'head', 'options']
+    authentication_class = CachedJWTAuthentication
+    permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    basename = None
+    queryset = None
+    serializer_class = None
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 500
+    chunk_size = 500
+
+    async def get(self, request, pk=None):
+        self.action = 'list' if pk is None else 'retrieve'
+        try:
+            await self.check_permissions(request)
+            await sync_to_async(self.check_throttles)(request)
+            if pk is None:
+                data = await self.list(request)
+            else:
+                data = await self.retrieve(request, pk)
+        except APIException as exc:
+            response = self.render({'detail': exc.detail} if isinstance(exc.detail, str) else exc.detail,
+                                   exc.status_code)
+            if exc.status_code == 401:
+                response['WWW-Authenticate'] = self.authentication_class().authenticate_header(request)
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = '%d' % exc.wait
+            return response
+        return self.render(data)
+
+    def render(self, data, status=200):
+        return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+    async def check_permissions(self, request):
+        result = await self.authentication_class().aauthenticate(request)
+        # Without a token, request.user would be AuthenticationMiddleware's
+        # lazy session user, which queries synchronously.
+        request.user, request.auth = result if result is not None else (AnonymousUser(), None)
+        for permission in self.permission_classes:
+            if not permission().has_permission(request, self):
+                raise NotAuthenticated() if result is None else PermissionDenied()
+
+    def check_throttles(self, request):
+        # Runs in a thread: the throttle cache may do blocking I/O.
+        throttles = [throttle() for throttle in api_settings.DEFAULT_THROTTLE_CLASSES]
+        waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, self)]
+        if waits:
+            raise Throttled(max((wait for wait in waits if wait is not None), default=None))
+
+    def get_queryset(self, request):
+        return self.queryset.all()
+
+    def get_serializer_context(self, request):
+        return {}
+
+    def get_page_size(self, request):
+        try:
+            return min(max(int(request.GET.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            return self.page_size
+
+    def decode_cursor(self, request):
+        cursor = request.GET.get('cursor')
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            raise NotFound('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        opts = self.queryset.model._meta
+        try:
+            values = [opts.get_field(field.lstrip('-')).to_python(value) for field, value in zip(self.ordering, values)]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if None in values:
+            raise NotFound('Invalid cursor')
+        return values
+
+    def encode_cursor(self, instance):
+        values = [
+            JSONRenderer().render(getattr(instance, field.lstrip('-'))).decode()
+            for field in self.ordering
+        ]
+        return base64.urlsafe_b64encode(f"[{','.join(values)}]".encode()).decode()
+
+    async def list(self, request):
+        context = self.get_serializer_context(request)
+        page_size = self.get_page_size(request)
+        queryset = self.get_queryset(request).order_by(*self.ordering)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, cursor))
+        rows = [row async for row in queryset[:page_size + 1].aiterator(chunk_size=self.chunk_size)]
+        next_url = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', self.encode_cursor(rows[-1]))
+        results = self.serializer_class(rows, many=True, context=context).data
+        return {'next': next_url, 'previous': None, 'results': results}
+
+    async def retrieve(self, request, pk):
+        context = self.get_serializer_context(request)
+        try:
+            instance = await self.get_queryset(request).aget(pk=pk)
+        except self.queryset.model.DoesNotExist:
+            raise NotFound()
+        return self.serializer_class(instance, context=context).data
+
+
+class AsyncProductView(AsyncReadView):
+    basename = 'product'
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+
+
+class AsyncCustomerView(AsyncReadView):
+    basename = 'customer'
+    queryset = Customer.objects.all()
+    serializer_class = CustomerSerializer
+
+
+class AsyncOrderView(AsyncReadView):
+    basename = 'order'
+    queryset = Order.objects.select_related('customer').prefetch_related('products')
+    serializer_class = OrderSerializer
+    ordering = ('-date', '-id')
+
+    def get_serializer_context(self, request):
+        expand = {field.strip() for field in request.GET.get('expand', '').split(',') if field.strip()}
+        unknown = expand - set(OrderSerializer.EXPANDABLE_FIELDS)
+        if unknown:
+            raise ValidationError({'expand': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return {'expand': expand}
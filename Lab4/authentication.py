@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+STAFF_CLAIM = 'is_staff'
+
+
+class LRUCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard_if(self, predicate):
+        with self._lock:
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = LRUCache(
+    getattr(settings, 'JWT_AUTH_CACHE_SIZE', 10000),
+    getattr(settings, 'JWT_AUTH_CACHE_TTL', 60),
+)
+
+
+def revocation_key(user_id):
+    return f'lab4:auth:revoked:{user_id}'
+
+
+def revoke_user_tokens(user_id):
+    # Tokens issued up to now stop authenticating in every process once their
+    # local cache entry expires, and in this process right away. "iat" has
+    # one-second resolution, so tokens issued later in the same second are
+    # rejected as well.
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    cache.set(revocation_key(user_id), time.time(), lifetime)
+    token_cache.discard_if(lambda entry: str(entry[1].get(api_settings.USER_ID_CLAIM)) == str(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that keeps verified tokens and their users in a
+    bounded, short-lived in-process LRU cache. Tokens carrying the staff
+    claim are turned into a TokenUser without loading the user row.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = token_cache.get(raw_token)
+        if cached is not None:
+            return cached
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        token_cache.set(raw_token, (user, validated_token), validated_token['exp'] - time.time())
+        return user, validated_token
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = token_cache.get(raw_token)
+        if cached is not None:
+            return cached
+
+        validated_token = self.get_validated_token(raw_token)
+        user = await self.aget_user(validated_token)
+        token_cache.set(raw_token, (user, validated_token), validated_token['exp'] - time.time())
+        return user, validated_token
+
+    def check_revoked(self, validated_token, revoked_at):
+        if revoked_at is not None and validated_token.get('iat', 0) <= revoked_at:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        self.check_revoked(validated_token, cache.get(revocation_key(user_id)) if user_id is not None else None)
+        if user_id is not None and STAFF_CLAIM in validated_token:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        return super().get_user(validated_token)
+
+    async def aget_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        self.check_revoked(validated_token, await cache.aget(revocation_key(user_id)) if user_id is not None else None)
+        if user_id is not None and STAFF_CLAIM in validated_token:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        return await sync_to_async(super().get_user)(validated_token)
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+from .metrics import register_collector
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def get_response_cache_timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def version_key(model, pk=None):
+    if model is None:
+        return 'lab4:version'
+    key = f'lab4:version:{model._meta.label_lower}'
+    return key if pk is None else f'{key}:{pk}'
+
+
+def invalidate_all_responses():
+    get_response_cache().set(version_key(None), uuid.uuid4().hex, None)
+
+
+def get_versions(keys):
+    cache = get_response_cache()
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    for key, value in missing.items():
+        # add() keeps a version another process created in the meantime.
+        if not cache.add(key, value, None):
+            versions[key] = cache.get(key, value)
+        else:
+            versions[key] = value
+    return [versions[key] for key in keys]
+
+
+def bump_versions(model, pks=(), using='default'):
+    """
+    Give the model's collection, and every object in `pks`, a new version so
+    cached responses built from them are no longer looked up.
+
+    The bump is repeated on commit: a response cached by a concurrent request
+    while the transaction was open would otherwise survive it.
+    """
+    keys = [version_key(model)] + [version_key(model, pk) for pk in pks]
+
+    def bump():
+        get_response_cache().set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump, using=using)
+
+
+def response_key(request, model, pk=None, dependencies=()):
+    keys = [version_key(None), version_key(model, pk) if pk is not None else version_key(model)]
+    keys += [version_key(dependency) for dependency in dependencies]
+    versions = get_versions(keys)
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    renderer = getattr(request, 'accepted_renderer', None)
+    raw = f'{request.get_host()}{request.path}?{params}:{getattr(renderer, "format", "")}:{versions}'
+    # v2 entries are (data, plain_json) pairs.
+    return 'lab4:response:v2:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def record_lookup(hit):
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+
+
+def response_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+@register_collector
+def collect_response_cache_metrics():
+    stats = response_cache_stats()
+    return [
+        '# HELP lab4_response_cache_lookups_total Response cache lookups by result.',
+        '# TYPE lab4_response_cache_lookups_total counter',
+        f'lab4_response_cache_lookups_total{{result="hit"}} {stats["hits"]}',
+        f'lab4_response_cache_lookups_total{{result="miss"}} {stats["misses"]}',
+    ]
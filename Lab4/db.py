@@ -0,0 +1,68 @@
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from .metrics import register_collector
+
+_lock = threading.Lock()
+_opened = Counter()
+
+# psycopg_pool.ConnectionPool.get_stats() keys exported as gauges and counters.
+POOL_GAUGES = {
+    'pool_min': ('lab4_db_pool_min_size', 'Configured minimum pool size.'),
+    'pool_max': ('lab4_db_pool_max_size', 'Configured maximum pool size.'),
+    'pool_size': ('lab4_db_pool_size', 'Connections currently held by the pool, in use or idle.'),
+    'pool_available': ('lab4_db_pool_available', 'Idle connections ready to be checked out.'),
+    'requests_waiting': ('lab4_db_pool_requests_waiting', 'Requests queued for a connection.'),
+}
+POOL_COUNTERS = {
+    'requests_num': ('lab4_db_pool_requests_total', 'Connections requested from the pool.'),
+    'requests_queued': ('lab4_db_pool_requests_queued_total', 'Requests that had to wait for a connection.'),
+    'requests_wait_ms': ('lab4_db_pool_requests_wait_milliseconds_total', 'Time spent waiting for a connection.'),
+    'requests_errors': ('lab4_db_pool_requests_errors_total', 'Requests that timed out or failed.'),
+    'connections_num': ('lab4_db_pool_connections_total', 'Connections opened by the pool.'),
+    'connections_ms': ('lab4_db_pool_connections_milliseconds_total', 'Time spent opening connections.'),
+}
+
+
+@receiver(connection_created)
+def count_opened_connection(sender, connection, **kwargs):
+    with _lock:
+        _opened[connection.alias] += 1
+
+
+def opened_connections():
+    with _lock:
+        return dict(_opened)
+
+
+def pool_stats(alias):
+    """The psycopg pool's statistics, or None if the alias is not pooled."""
+    connection = connections[alias]
+    if not connection.settings_dict.get('OPTIONS', {}).get('pool'):
+        return None
+    pool = getattr(connection, 'pool', None)
+    return pool.get_stats() if pool is not None else None
+
+
+@register_collector
+def collect_database_metrics():
+    lines = [
+        '# HELP lab4_db_connections_opened_total Database connections opened (or checked out of a pool) by Django.',
+        '# TYPE lab4_db_connections_opened_total counter',
+    ]
+    for alias, count in sorted(opened_connections().items()):
+        lines.append(f'lab4_db_connections_opened_total{{alias="{alias}"}} {count}')
+
+    stats = {alias: pool_stats(alias) for alias in connections}
+    stats = {alias: values for alias, values in stats.items() if values is not None}
+    if not stats:
+        return lines
+    for metrics, metric_type in ((POOL_GAUGES, 'gauge'), (POOL_COUNTERS, 'counter')):
+        for key, (name, documentation) in metrics.items():
+            lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}'])
+            for alias, values in sorted(stats.items()):
+                lines.append(f'{name}{{alias="{alias}"}} {values.get(key, 0)}')
+    return lines
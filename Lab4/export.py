@@ -0,0 +1,84 @@
+import csv
+import json
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.conf import settings
+from .representation import represent_rows, value_columns
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def get_export_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_columns(queryset, serializer_class):
+    # serializer_class may also be a view's get_serializer, so that the
+    # fields it chooses are exported.
+    return value_columns(queryset.model, serializer_class().fields)
+
+
+def export_records(queryset, serializer_class, chunk_size=None):
+    """
+    Yields the serializer's representation of every row as a dict, reading
+    `chunk_size` rows at a time and each chunk's many-to-many ids in one
+    query, so memory does not grow with the table.
+    """
+    chunk_size = chunk_size or get_export_chunk_size()
+    columns, many_to_many = export_columns(queryset, serializer_class)
+    pk_attname = queryset.model._meta.pk.attname
+    names = [attname for _, attname, _ in columns]
+    if pk_attname not in names:
+        names.append(pk_attname)
+    rows = (
+        queryset.select_related(None).prefetch_related(None).order_by('pk')
+        .values_list(*names).iterator(chunk_size=chunk_size)
+    )
+    for chunk in chunked(rows, chunk_size):
+        yield from represent_rows(chunk, columns, many_to_many, names.index(pk_attname), queryset.db)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, serializer_class, chunk_size=None):
+    columns, many_to_many = export_columns(queryset, serializer_class)
+    header = [name for name, _, _ in columns] + [name for name, _ in many_to_many]
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for record in export_records(queryset, serializer_class, chunk_size):
+        yield writer.writerow([
+            ' '.join(map(str, value)) if isinstance(value, list) else value
+            for value in (record[name] for name in header)
+        ])
+
+
+def stream_ndjson(queryset, serializer_class, chunk_size=None):
+    for record in export_records(queryset, serializer_class, chunk_size):
+        yield json.dumps(record) + '\n'
+
+
+def stream_export(queryset, serializer_class, export_format, chunk_size=None):
+    if export_format == 'csv':
+        return stream_csv(queryset, serializer_class, chunk_size)
+    return stream_ndjson(queryset, serializer_class, chunk_size)
+
+
+def stream_fulfilment(queryset, chunk_size=None):
+    """NDJSON fulfilment status of every order in `queryset`, read in one query."""
+    rows = queryset.blocking_products().iterator(chunk_size=chunk_size or get_export_chunk_size())
+    for pk, lines in groupby(rows, key=itemgetter(0)):
+        blocking = [product_pk for _, product_pk in lines if product_pk is not None]
+        yield json.dumps({'id': pk, 'fulfillable': not blocking, 'blocking_products': blocking}) + '\n'
@@ -0,0 +1,54 @@
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend, OrderingFilter, SearchFilter
+from .models import Order
+from .search import get_search_backend
+
+
+class ProductSearchFilter(SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, terms)
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    DATE_FORMATS = ['iso-8601', '%Y-%m-%d']
+
+    status = serializers.ListField(child=serializers.ChoiceField(choices=Order.STATUS_CHOICES), required=False)
+    customer = serializers.IntegerField(required=False)
+    date_after = serializers.DateTimeField(input_formats=DATE_FORMATS, required=False)
+    date_before = serializers.DateTimeField(input_formats=DATE_FORMATS, required=False)
+
+
+class OrderFilter(BaseFilterBackend):
+    """
+    `?status=` (repeatable), `?customer=`, `?date_after=` (inclusive) and
+    `?date_before=` (exclusive), served by the (status, date, id) and
+    (customer, date, id) indexes.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = OrderFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+        if filters.get('status'):
+            queryset = queryset.filter(status__in=filters['status'])
+        if 'customer' in filters:
+            queryset = queryset.filter(customer_id=filters['customer'])
+        if 'date_after' in filters:
+            queryset = queryset.filter(date__gte=filters['date_after'])
+        if 'date_before' in filters:
+            queryset = queryset.filter(date__lt=filters['date_before'])
+        return queryset
+
+
+class OrderDateOrderingFilter(OrderingFilter):
+    """`?ordering=date` or `-date`, with the id as a tie-breaker for cursor pagination."""
+    ordering_fields = ['date']
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return (ordering[0], '-id' if ordering[0].startswith('-') else 'id')
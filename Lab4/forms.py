@@ -4,4 +4,4 @@ from .models import Product
 class ProductForm(forms.ModelForm):
   class Meta:
     model = Product
-    fields = ['name', 'price', 'available']
\ No newline at end of file
+    fields = ['name', 'price', 'available', 'stock']
\ No newline at end of file
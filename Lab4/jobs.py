@@ -0,0 +1,162 @@
+import datetime
+import logging
+import traceback
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction
+from django.db.models import Count, F, Min, Subquery
+from django.utils import timezone
+from .metrics import register_collector
+from .models import Job, Order
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for a failure that retrying cannot fix."""
+
+
+def job_handler(kind):
+    """Registers `func(payload, using)` to run the jobs of `kind`."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def get_max_attempts():
+    return getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+
+
+def retry_delay(attempts):
+    """Seconds before a job that failed `attempts` times runs again: doubling, up to a cap."""
+    base = getattr(settings, 'JOB_RETRY_DELAY', 5)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_MAX_DELAY', 300))
+
+
+def enqueue(kind, payload, using=None):
+    if kind not in _handlers:
+        raise ValueError(f'No handler for {kind} jobs.')
+    using = using or router.db_for_write(Job)
+    return Job.objects.using(using).create(kind=kind, payload=payload, max_attempts=get_max_attempts())
+
+
+def enqueue_many(kind, payloads, using=None):
+    """enqueue() for several jobs of one kind, with a single INSERT."""
+    if kind not in _handlers:
+        raise ValueError(f'No handler for {kind} jobs.')
+    using = using or router.db_for_write(Job)
+    max_attempts = get_max_attempts()
+    return Job.objects.using(using).bulk_create(
+        [Job(kind=kind, payload=payload, max_attempts=max_attempts) for payload in payloads]
+    )
+
+
+def requeue_abandoned(using):
+    """Returns running jobs whose worker stopped answering to the queue."""
+    timeout = datetime.timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+    return Job.objects.using(using).filter(status=Job.RUNNING, claimed_at__lt=timezone.now() - timeout).update(
+        status=Job.QUEUED, claimed_by='', claimed_at=None, last_error='Abandoned by its worker.'
+    )
+
+
+def claim_jobs(limit, using):
+    """
+    Marks up to `limit` ready jobs as running and returns their ids, in one
+    UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED). Concurrent
+    workers claim different jobs without waiting for each other.
+    """
+    token = uuid.uuid4().hex
+    ready = (
+        Job.objects.using(using).select_for_update(skip_locked=True)
+        .filter(status=Job.QUEUED, run_at__lte=timezone.now()).order_by('run_at', 'id')
+        .values('pk')[:limit]
+    )
+    with transaction.atomic(using=using):
+        claimed = Job.objects.using(using).filter(pk__in=Subquery(ready)).update(
+            status=Job.RUNNING, claimed_by=token, claimed_at=timezone.now(), attempts=F('attempts') + 1
+        )
+    if not claimed:
+        return []
+    return list(Job.objects.using(using).filter(claimed_by=token).order_by('run_at', 'id').values_list('pk', flat=True))
+
+
+def run_job(pk, using='default'):
+    """Runs a claimed job and records the outcome: 'done', 'retry' or 'failed'."""
+    job = Job.objects.using(using).get(pk=pk)
+    try:
+        handler = _handlers.get(job.kind)
+        if handler is None:
+            raise PermanentJobError(f'No handler for {job.kind} jobs.')
+        handler(job.payload, using)
+    except Exception as exc:
+        return fail_job(job, exc, using)
+    Job.objects.using(using).filter(pk=pk, claimed_by=job.claimed_by).update(
+        status=Job.DONE, finished=timezone.now(), last_error=''
+    )
+    return 'done'
+
+
+def run_claimed_job(pk, using):
+    """run_job() for pool workers, which like requests drop broken or expired connections."""
+    close_old_connections()
+    try:
+        return run_job(pk, using)
+    finally:
+        close_old_connections()
+
+
+def fail_job(job, exc, using):
+    error = ''.join(traceback.format_exception(exc))
+    claimed = Job.objects.using(using).filter(pk=job.pk, claimed_by=job.claimed_by)
+    if isinstance(exc, PermanentJobError) or job.attempts >= job.max_attempts:
+        logger.error('Job %s failed after %s attempts: %s', job, job.attempts, exc)
+        claimed.update(status=Job.FAILED, finished=timezone.now(), last_error=error)
+        return 'failed'
+    logger.warning('Job %s failed, retrying: %s', job, exc)
+    claimed.update(
+        status=Job.QUEUED, claimed_by='', claimed_at=None, last_error=error,
+        run_at=timezone.now() + datetime.timedelta(seconds=retry_delay(job.attempts)),
+    )
+    return 'retry'
+
+
+@job_handler('order.transition')
+def transition_order(payload, using):
+    with transaction.atomic(using=using):
+        try:
+            order = Order.objects.using(using).select_for_update().get(pk=payload['order'])
+        except Order.DoesNotExist:
+            raise PermanentJobError(f"Order {payload['order']} does not exist.")
+        # A retry after the change was saved finds it done.
+        if order.status == payload['status']:
+            return
+        if Order.STATUS_TRANSITIONS.get(order.status) != payload['status']:
+            raise PermanentJobError(f"Order {order.pk} cannot move from {order.status} to {payload['status']}.")
+        order.status = payload['status']
+        order.save(update_fields=['status'])
+
+
+@register_collector
+def collect_job_metrics():
+    lines = [
+        '# HELP lab4_jobs Background jobs by status.',
+        '# TYPE lab4_jobs gauge',
+    ]
+    counts = dict(Job.objects.values_list('status').annotate(count=Count('pk')).order_by())
+    for status, _ in Job.STATUS_CHOICES:
+        lines.append(f'lab4_jobs{{status="{status}"}} {counts.get(status, 0)}')
+    ready = Job.objects.filter(status=Job.QUEUED, run_at__lte=timezone.now())
+    oldest = ready.aggregate(oldest=Min('run_at'))['oldest']
+    lines += [
+        '# HELP lab4_job_queue_depth Queued jobs that are due to run.',
+        '# TYPE lab4_job_queue_depth gauge',
+        f'lab4_job_queue_depth {ready.count()}',
+        '# HELP lab4_job_queue_wait_seconds How long the oldest due job has been waiting.',
+        '# TYPE lab4_job_queue_wait_seconds gauge',
+        f'lab4_job_queue_wait_seconds {(timezone.now() - oldest).total_seconds() if oldest else 0:.3f}',
+    ]
+    return lines
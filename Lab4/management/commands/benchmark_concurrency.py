@@ -0,0 +1,149 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+from Lab4.serializers import StaffClaimTokenObtainPairSerializer
+from .benchmark_endpoints import percentile, successful_latencies, unthrottled
+
+
+class QueryLatency:
+    # Stands in for the network round trip to a remote database server.
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self, connection):
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+async def asgi_get(application, host, path, query_string, authorization):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [(b'host', host.encode()), (b'authorization', authorization.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (host, 80),
+    }
+    body_sent = False
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected until the handler cancels this wait.
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = 'Compares concurrent read throughput of the sync viewsets and the async ASGI views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resource', choices=['products', 'customers', 'orders'], default='products')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Requests in flight at once on the async path.')
+        parser.add_argument('--sync-workers', type=int, default=4,
+                            help='Worker threads serving the sync path, as in one WSGI process.')
+        parser.add_argument('--query-latency-ms', type=float, default=20.0,
+                            help='Delay added to every SQL query to model a remote database.')
+        parser.add_argument('--username', default='benchmark')
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency'], options['sync_workers']) < 1:
+            raise CommandError('--requests, --concurrency and --sync-workers must be positive.')
+        user, _ = get_user_model().objects.get_or_create(
+            username=options['username'], defaults={'is_staff': True}
+        )
+        self.authorization = f'Bearer {StaffClaimTokenObtainPairSerializer.get_token(user).access_token}'
+        basename = options['resource'][:-1]
+
+        latency = QueryLatency(options['query_latency_ms'] / 1000)
+        connection_created.connect(latency.install)
+        connections.close_all()
+        try:
+            with unthrottled():
+                sync_result = self.run_sync(reverse(f'{basename}-list'), options)
+                async_result = self.run_async(reverse(f'async-{basename}-list'), options)
+        finally:
+            connection_created.disconnect(latency.install)
+            for connection in connections.all():
+                latency.uninstall(connection)
+            connections.close_all()
+
+        for name, (latencies, elapsed, errors) in (('sync', sync_result), ('async', async_result)):
+            self.stdout.write(
+                f"{name:6} {options['requests'] / elapsed:8.1f} req/s  p50 {percentile(latencies, 50):8.2f}ms  "
+                f"p95 {percentile(latencies, 95):8.2f}ms  {errors} errors"
+            )
+        self.stdout.write(f'async/sync throughput: {sync_result[1] / async_result[1]:.2f}x')
+
+    def run_sync(self, path, options):
+        client = Client(HTTP_HOST=options['host'], HTTP_AUTHORIZATION=self.authorization)
+
+        def get(index):
+            started = time.perf_counter()
+            # A unique query string keeps the response cache out of the comparison.
+            response = client.get(path, {'request': index})
+            return (time.perf_counter() - started) * 1000, response.status_code >= 400
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['sync_workers']) as executor:
+            results = list(executor.map(get, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        return self.summarize(results, elapsed, 'sync')
+
+    def run_async(self, path, options):
+        application = ASGIHandler()
+
+        async def main():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def get(index):
+                async with semaphore:
+                    started = time.perf_counter()
+                    status = await asgi_get(application, options['host'], path, f'request={index}', self.authorization)
+                    return (time.perf_counter() - started) * 1000, status >= 400
+
+            return await asyncio.gather(*(get(index) for index in range(options['requests'])))
+
+        started = time.perf_counter()
+        results = asyncio.run(main())
+        elapsed = time.perf_counter() - started
+        return self.summarize(results, elapsed, 'async')
+
+    def summarize(self, results, elapsed, label):
+        latencies, errors = zip(*results)
+        return successful_latencies(latencies, errors, label), elapsed, sum(errors)
@@ -0,0 +1,122 @@
+import copy
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+from Lab4.db import opened_connections
+from Lab4.serializers import StaffClaimTokenObtainPairSerializer
+from .benchmark_endpoints import percentile, successful_latencies, unthrottled
+
+MODES = ('per-request', 'persistent', 'pool')
+
+
+def supports_pool(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    return is_psycopg3
+
+
+@contextmanager
+def connection_mode(alias, mode, pool_options):
+    """Temporarily reconfigures `alias` as Django would from DATABASES."""
+    connection = connections[alias]
+    original = copy.deepcopy(connection.settings_dict)
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = 600 if mode == 'persistent' else 0
+    connection.settings_dict['CONN_HEALTH_CHECKS'] = mode == 'persistent'
+    options = connection.settings_dict.setdefault('OPTIONS', {})
+    options.pop('pool', None)
+    if mode == 'pool':
+        options['pool'] = pool_options
+    try:
+        yield connection
+    finally:
+        connection.close()
+        if mode == 'pool':
+            connection.close_pool()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(original)
+
+
+class Command(BaseCommand):
+    help = 'Compares connection setup cost per request without reuse, with persistent connections and with a pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='*', choices=MODES, help='Defaults to every mode the database supports.')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--pool-min-size', type=int, default=2)
+        parser.add_argument('--pool-max-size', type=int, default=4)
+        parser.add_argument('--username', default='benchmark')
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        # Requests always run against the default database.
+        alias = 'default'
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+        modes = options['modes'] or [
+            mode for mode in MODES if mode != 'pool' or supports_pool(connections[alias])
+        ]
+        if 'pool' in modes and not supports_pool(connections[alias]):
+            raise CommandError('Pooling needs PostgreSQL with psycopg 3.')
+
+        user, _ = get_user_model().objects.get_or_create(
+            username=options['username'], defaults={'is_staff': True}
+        )
+        token = StaffClaimTokenObtainPairSerializer.get_token(user).access_token
+        self.environ = {'HTTP_HOST': options['host'], 'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        pool_options = {'min_size': options['pool_min_size'], 'max_size': options['pool_max_size']}
+
+        for mode in modes:
+            with connection_mode(alias, mode, pool_options) as connection, unthrottled():
+                connect_ms = self.time_connect(connection, options['requests'])
+                latencies, elapsed, opened, errors = self.run_requests(alias, options['requests'])
+            self.stdout.write(
+                f"{mode:12} connect {connect_ms:7.3f}ms  p50 {percentile(latencies, 50):7.2f}ms  "
+                f"p95 {percentile(latencies, 95):7.2f}ms  {options['requests'] / elapsed:8.1f} req/s  "
+                f"{opened / options['requests']:5.2f} connections/request"
+                + (f'  {errors} errors' if errors else '')
+            )
+
+    def time_connect(self, connection, iterations):
+        # Time to get a usable connection, as paid at the start of a request
+        # that finds none open.
+        total = 0.0
+        for _ in range(iterations):
+            connection.close()
+            started = time.perf_counter()
+            connection.ensure_connection()
+            total += time.perf_counter() - started
+        connection.close()
+        return total / iterations * 1000
+
+    def run_requests(self, alias, count):
+        # WSGIHandler rather than the test client, so connections are closed
+        # or kept at the end of every request exactly as in production.
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        path = reverse('product-list')
+        opened_before = opened_connections().get(alias, 0)
+        latencies, errors = [], []
+        started = time.perf_counter()
+        for index in range(count):
+            # A unique query string keeps the response cache from hiding the queries.
+            environ = factory._base_environ(
+                PATH_INFO=path, REQUEST_METHOD='GET', QUERY_STRING=f'page_size=10&request={index}', **self.environ
+            )
+            request_started = time.perf_counter()
+            statuses = []
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(response)
+            response.close()
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            errors.append(int(statuses[0].split()[0]) >= 400)
+        elapsed = time.perf_counter() - started
+        opened = opened_connections().get(alias, 0) - opened_before
+        return successful_latencies(latencies, errors, 'product list'), elapsed, opened, sum(errors)
@@ -0,0 +1,195 @@
+import json
+import math
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.settings import api_settings
+from Lab4.cache import invalidate_all_responses
+from Lab4.models import Product, Customer, Order
+from Lab4.serializers import StaffClaimTokenObtainPairSerializer
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def successful_latencies(latencies, errors, label):
+    """The latencies of the requests that succeeded; failures are only counted."""
+    latencies = [latency for latency, error in zip(latencies, errors) if not error]
+    if not latencies:
+        raise CommandError(f'Every {label} request failed.')
+    return latencies
+
+
+def unthrottled():
+    """Lifts the API rate limits, which would refuse most benchmark requests."""
+    rest_framework = getattr(settings, 'REST_FRAMEWORK', {})
+    rates = dict.fromkeys(api_settings.DEFAULT_THROTTLE_RATES)
+    return override_settings(REST_FRAMEWORK={**rest_framework, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+def build_scenarios(search_term):
+    product = Product.objects.order_by('id').first()
+    customer = Customer.objects.order_by('id').first()
+    order = Order.objects.order_by('id').first()
+    if not (product and customer and order):
+        raise CommandError('The database is empty; run populate_sample_data first.')
+
+    def detail(basename, pk):
+        return reverse(f'{basename}-detail', kwargs={'pk': pk})
+
+    return [
+        ('products-list', 'get', reverse('product-list'), None),
+        ('products-retrieve', 'get', detail('product', product.pk), None),
+        ('products-search', 'get', f"{reverse('product-list')}?search={search_term}", None),
+        ('products-create', 'post', reverse('product-list'),
+         {'name': 'Benchmark product', 'price': '9.99', 'available': True}),
+        ('customers-list', 'get', reverse('customer-list'), None),
+        ('customers-retrieve', 'get', detail('customer', customer.pk), None),
+        ('customers-create', 'post', reverse('customer-list'),
+         {'name': 'Benchmark customer', 'address': '1 Benchmark St'}),
+        ('orders-list', 'get', reverse('order-list'), None),
+        ('orders-list-expanded', 'get', f"{reverse('order-list')}?expand=customer,products", None),
+        ('orders-retrieve', 'get', detail('order', order.pk), None),
+        ('orders-create', 'post', reverse('order-list'),
+         {'customer': customer.pk, 'status': 'New', 'products': [product.pk]}),
+        ('html-product-list', 'get', reverse('product_list'), None),
+        ('html-product-detail', 'get', reverse('product_detail', kwargs={'pk': product.pk}), None),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Measures latency, throughput, query counts and memory of the API and HTML endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--cold', action='store_true',
+                            help='Invalidate cached API responses before every request.')
+        parser.add_argument('--search-term', default='Product')
+        parser.add_argument('--only', nargs='*', help='Run only these scenarios.')
+        parser.add_argument('--username', default='benchmark')
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Compare against results saved by an earlier run.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative p95 slowdown before a scenario counts as a regression.')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations must be positive and --warmup must not be negative.')
+        user, _ = get_user_model().objects.get_or_create(
+            username=options['username'], defaults={'is_staff': True}
+        )
+        if not user.is_staff:
+            raise CommandError(f"User {options['username']} must be staff to run the create scenarios.")
+        token = StaffClaimTokenObtainPairSerializer.get_token(user).access_token
+        client = Client(HTTP_HOST=options['host'], HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        scenarios = build_scenarios(options['search_term'])
+        if options['only']:
+            scenarios = [scenario for scenario in scenarios if scenario[0] in options['only']]
+
+        results = {}
+        for name, method, url, payload in scenarios:
+            with unthrottled():
+                results[name] = self.run_scenario(name, client, method, url, payload, options)
+            self.stdout.write(
+                f"{name:24} p50 {results[name]['p50_ms']:8.2f}ms  p95 {results[name]['p95_ms']:8.2f}ms  "
+                f"p99 {results[name]['p99_ms']:8.2f}ms  {results[name]['throughput_rps']:8.1f} req/s  "
+                f"{results[name]['queries']:5.1f} queries  {results[name]['peak_memory_kb']:8.1f} KiB"
+                + (f"  {results[name]['errors']} errors" if results[name]['errors'] else '')
+            )
+
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'iterations': options['iterations'],
+            'cold': options['cold'],
+            'dataset': {
+                'products': Product.objects.count(),
+                'customers': Customer.objects.count(),
+                'orders': Order.objects.count(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = self.compare(json.load(baseline)['results'], results, options['threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.WARNING(f'REGRESSION {regression}'))
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}.')
+
+    def request(self, client, method, url, payload):
+        # Writes are rolled back so every run sees the same dataset.
+        with transaction.atomic():
+            with CaptureQueriesContext(connections['default']) as captured:
+                if payload is None:
+                    response = getattr(client, method)(url)
+                else:
+                    response = getattr(client, method)(url, payload, content_type='application/json')
+            transaction.set_rollback(True)
+        return response, len(captured.captured_queries)
+
+    def run_scenario(self, name, client, method, url, payload, options):
+        for _ in range(options['warmup']):
+            self.request(client, method, url, payload)
+
+        latencies = []
+        queries = 0
+        errors = []
+        started = time.perf_counter()
+        for _ in range(options['iterations']):
+            if options['cold']:
+                invalidate_all_responses()
+            request_started = time.perf_counter()
+            response, query_count = self.request(client, method, url, payload)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            queries += query_count
+            errors.append(response.status_code >= 400)
+        elapsed = time.perf_counter() - started
+        latencies = successful_latencies(latencies, errors, name)
+
+        if options['cold']:
+            invalidate_all_responses()
+        tracemalloc.start()
+        self.request(client, method, url, payload)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'throughput_rps': round(options['iterations'] / elapsed, 1),
+            'queries': queries / options['iterations'],
+            'peak_memory_kb': round(peak / 1024, 1),
+            'errors': sum(errors),
+        }
+
+    def compare(self, baseline, results, threshold):
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+                regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+            if result['queries'] > before['queries']:
+                regressions.append(f"{name}: queries {before['queries']} -> {result['queries']}")
+        return regressions
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from Lab4.export import EXPORT_FORMATS, stream_export
+from Lab4.models import Product, Customer, Order
+from Lab4.serializers import ProductSerializer, CustomerSerializer, OrderSerializer
+
+RESOURCES = {
+    'products': (Product, ProductSerializer),
+    'customers': (Customer, CustomerSerializer),
+    'orders': (Order, OrderSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = 'Streams products, customers or orders as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(RESOURCES))
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='File to write to instead of standard output.')
+        parser.add_argument('--chunk-size', type=int, help='Rows read per query (EXPORT_CHUNK_SIZE).')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        model, serializer_class = RESOURCES[options['resource']]
+        queryset = model.objects.using(options['database']).all()
+        chunks = stream_export(queryset, serializer_class, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
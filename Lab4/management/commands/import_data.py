@@ -0,0 +1,247 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.utils import timezone
+from Lab4.export import chunked
+from Lab4.models import Product
+from Lab4.signals import bulk_saved, bulk_saving
+from .export_data import RESOURCES
+from .populate_sample_data import bulk_create_keeping_dates, copy_objects
+
+
+def read_records(path, input_format):
+    with open(path, newline='') as source:
+        if input_format == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def related_ids(value):
+    # NDJSON carries a list of ids, CSV the space-separated ids export_data writes.
+    if isinstance(value, str):
+        return value.split()
+    return value or []
+
+
+class Checkpoint:
+    """Records how many input rows are committed so an import can resume."""
+
+    def __init__(self, path, resource, source):
+        self.path = path
+        self.resource = resource
+        self.source = os.path.abspath(source)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as checkpoint:
+            state = json.load(checkpoint)
+        if state['resource'] != self.resource or state['source'] != self.source:
+            raise CommandError(f'{self.path} belongs to an import of {state["resource"]} from {state["source"]}.')
+        return state['rows']
+
+    def save(self, rows):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump({'resource': self.resource, 'source': self.source, 'rows': rows}, checkpoint)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Command(BaseCommand):
+    help = 'Loads products, customers or orders from a CSV or NDJSON file, keeping their ids.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(RESOURCES))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format; guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows validated and committed together.')
+        parser.add_argument('--copy', action='store_true',
+                            help='Write batches through a COPY-loaded staging table (PostgreSQL only).')
+        parser.add_argument('--resume', action='store_true', help='Skip the rows committed by an interrupted run.')
+        parser.add_argument('--checkpoint', help='Checkpoint file; defaults to <path>.checkpoint.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        self.using = options['database']
+        self.model = RESOURCES[options['resource']][0]
+        self.use_copy = options['copy']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if self.use_copy and connections[self.using].vendor != 'postgresql':
+            raise CommandError('--copy is only supported on PostgreSQL.')
+        input_format = options['format'] or ('csv' if options['path'].endswith('.csv') else 'ndjson')
+        checkpoint = Checkpoint(
+            options['checkpoint'] or f"{options['path']}.checkpoint", options['resource'], options['path']
+        )
+        if not options['resume']:
+            checkpoint.clear()
+        skipped = checkpoint.load()
+        if skipped:
+            self.stdout.write(f'Resuming after {skipped} committed rows.')
+
+        opts = self.model._meta
+        self.fields = list(opts.concrete_fields)
+        self.foreign_keys = [field for field in self.fields if field.is_relation]
+        self.many_to_many = list(opts.many_to_many)
+
+        started = time.perf_counter()
+        position, imported, rejected = skipped, 0, 0
+        records = islice(read_records(options['path'], input_format), skipped, None)
+        for batch in chunked(records, options['batch_size']):
+            instances, relations, errors = self.validate(batch, position)
+            for line, error in errors:
+                self.stderr.write(f'Row {line}: {error}')
+            with transaction.atomic(using=self.using):
+                self.write(instances, relations)
+            position += len(batch)
+            imported += len(instances)
+            rejected += len(errors)
+            checkpoint.save(position)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{position} rows read, {imported / (time.perf_counter() - started):.0f} rows/s')
+
+        connection = connections[self.using]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [self.model]):
+                cursor.execute(sql)
+        checkpoint.clear()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Imported {imported} {opts.verbose_name_plural} ({rejected} rejected) in {elapsed:.1f}s, '
+            f'{imported / elapsed if elapsed else 0:.0f} rows/s.'
+        )
+
+    def build(self, record):
+        instance = self.model()
+        for field in self.fields:
+            if field.name in record:
+                value = record[field.name]
+                # CSV writes None as an empty cell.
+                if value == '' and field.null:
+                    value = None
+                setattr(instance, field.attname, value)
+            elif getattr(field, 'auto_now_add', False):
+                setattr(instance, field.attname, timezone.now())
+        # Foreign keys are only converted here; their targets are checked
+        # once per batch in validate() rather than with a query per row.
+        for field in self.foreign_keys:
+            value = field.target_field.to_python(getattr(instance, field.attname))
+            if value is None:
+                raise ValidationError({field.name: ['This field is required.']})
+            setattr(instance, field.attname, value)
+        instance.clean_fields(exclude=[field.name for field in self.foreign_keys])
+        if instance.pk in self.model._meta.pk.empty_values:
+            raise ValidationError({self.model._meta.pk.name: ['This field is required.']})
+        instance.clean()
+        # As Product.save() does, which the upsert bypasses.
+        if self.model is Product and instance.stock is not None:
+            instance.available = instance.stock > 0
+        related = {
+            field.name: [field.related_model._meta.pk.to_python(value) for value in related_ids(record.get(field.name))]
+            for field in self.many_to_many
+        }
+        return instance, related
+
+    def validate(self, batch, position):
+        rows, errors = [], []
+        for line, record in enumerate(batch, start=position + 1):
+            try:
+                rows.append((line, *self.build(record)))
+            except ValidationError as exc:
+                errors.append((line, '; '.join(exc.messages)))
+
+        missing = {}
+        for field in self.foreign_keys:
+            ids = {getattr(instance, field.attname) for _, instance, _ in rows}
+            missing[field] = ids - self.existing_ids(field.related_model, ids)
+        for field in self.many_to_many:
+            ids = {pk for _, _, related in rows for pk in related[field.name]}
+            missing[field] = ids - self.existing_ids(field.related_model, ids)
+
+        # A row repeated within a batch would hit the same conflict twice, so
+        # the last occurrence wins as it would across batches.
+        accepted = {}
+        for line, instance, related in rows:
+            unknown = [
+                f'{field.related_model._meta.verbose_name} {pk} does not exist'
+                for field, pks in missing.items()
+                for pk in (related[field.name] if field.many_to_many else [getattr(instance, field.attname)])
+                if pk in pks
+            ]
+            if unknown:
+                errors.append((line, '; '.join(unknown)))
+                continue
+            accepted.pop(instance.pk, None)
+            accepted[instance.pk] = (instance, related)
+        errors.sort()
+        return [instance for instance, _ in accepted.values()], [related for _, related in accepted.values()], errors
+
+    def existing_ids(self, model, ids):
+        if not ids:
+            return set()
+        return set(model.objects.using(self.using).filter(pk__in=ids).values_list('pk', flat=True))
+
+    def write(self, instances, relations):
+        if not instances:
+            return
+        bulk_saving.send(sender=self.model, instances=instances, using=self.using)
+        if self.use_copy:
+            self.copy_upsert(self.model, instances)
+        else:
+            bulk_create_keeping_dates(
+                self.model, instances, self.using,
+                update_conflicts=True,
+                unique_fields=[self.model._meta.pk.name],
+                update_fields=[field.name for field in self.fields if not field.primary_key],
+            )
+        for field in self.many_to_many:
+            through = field.remote_field.through
+            source, target = field.m2m_column_name(), field.m2m_reverse_name()
+            through.objects.using(self.using).filter(**{f'{source}__in': [instance.pk for instance in instances]}).delete()
+            lines = [
+                through(**{source: instance.pk, target: pk})
+                for instance, related in zip(instances, relations)
+                for pk in dict.fromkeys(related[field.name])
+            ]
+            if self.use_copy:
+                copy_objects(through, lines, self.using)
+            else:
+                through.objects.using(self.using).bulk_create(lines)
+        bulk_saved.send(sender=self.model, instances=instances, created=True, using=self.using)
+
+    def copy_upsert(self, model, instances):
+        # COPY cannot resolve conflicts, so rows land in a temporary table
+        # and are merged with a single INSERT ... ON CONFLICT.
+        connection = connections[self.using]
+        quote = connection.ops.quote_name
+        table = model._meta.db_table
+        staging = f'{table}_import'
+        columns = ', '.join(quote(field.column) for field in self.fields)
+        updates = ', '.join(
+            f'{quote(field.column)} = EXCLUDED.{quote(field.column)}' for field in self.fields if not field.primary_key
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {quote(staging)} (LIKE {quote(table)} INCLUDING DEFAULTS) ON COMMIT DROP'
+            )
+            copy_objects(model, instances, self.using, table=staging)
+            cursor.execute(
+                f'INSERT INTO {quote(table)} ({columns}) SELECT {columns} FROM {quote(staging)} '
+                f'ON CONFLICT ({quote(model._meta.pk.column)}) DO UPDATE SET {updates}'
+            )
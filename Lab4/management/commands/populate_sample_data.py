@@ -1,57 +1,201 @@
-from django.core.management.base import BaseCommand
+import csv
+import io
+import multiprocessing
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.utils import timezone
+from Lab4.aggregates import rebuild_sales_aggregates
+from Lab4.cache import invalidate_all_responses
 from Lab4.models import Product, Customer, Order
+from Lab4.search import get_search_backend
+from Lab4.workers import setup_worker_process
 
-class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        Product.objects.all().delete()
-        Customer.objects.all().delete()
-        Order.objects.all().delete()
-        
-        product1 = Product.objects.create(
-            name='Product 1',
-            price=19.99,
-            available=True
-        )
-        product2 = Product.objects.create(
-            name='Product 2',
-            price=29.99,
-            available=True
-        )
-        product3 = Product.objects.create(
-            name='Product 3',
-            price=39.99,
-            available=False
-        )
-        
-        customer1 = Customer.objects.create(
-            name='Customer 1',
-            address='123 Main St'
-        )
-        customer2 = Customer.objects.create(
-            name='Customer 2',
-            address='456 Elm St'
-        )
-        customer3 = Customer.objects.create(
-            name='Customer 3',
-            address='789 Oak St'
-        )
-        
-        order1 = Order.objects.create(
-            customer=customer1,
-            status='New'
+STREETS = ['Main', 'Elm', 'Oak', 'Pine', 'Maple', 'Cedar', 'Birch', 'Lake', 'Hill', 'Park']
+STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+
+
+def row_random(seed, kind, index):
+    # One generator per row keeps the data identical whatever the batch size
+    # or the number of worker processes.
+    return random.Random(f'{seed}:{kind}:{index}')
+
+
+def generate_products(seed, start, stop):
+    for index in range(start, stop):
+        rng = row_random(seed, 'product', index)
+        yield Product(
+            id=index,
+            name=f'Product {index}',
+            price=Decimal(rng.randrange(100, 100000)) / 100,
+            available=rng.random() < 0.9,
         )
-        order1.products.add(product1, product2)
-        
-        order2 = Order.objects.create(
-            customer=customer2,
-            status='In Process'
+
+
+def generate_customers(seed, start, stop):
+    for index in range(start, stop):
+        rng = row_random(seed, 'customer', index)
+        yield Customer(
+            id=index,
+            name=f'Customer {index}',
+            address=f'{rng.randrange(1, 1000)} {rng.choice(STREETS)} St',
         )
-        order2.products.add(product2, product3)
-        
-        order3 = Order.objects.create(
-            customer=customer3,
-            status='Completed'
+
+
+def generate_orders(seed, start, stop, customers, products, lines_per_order, now):
+    Line = Order.products.through
+    orders, lines = [], []
+    for index in range(start, stop):
+        rng = row_random(seed, 'order', index)
+        orders.append(Order(
+            id=index,
+            customer_id=rng.randrange(1, customers + 1),
+            date=now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+            status=rng.choice(STATUSES),
+        ))
+        for product_id in rng.sample(range(1, products + 1), min(lines_per_order, products)):
+            lines.append(Line(order_id=index, product_id=product_id))
+    return orders, lines
+
+
+def bulk_create_keeping_dates(model, objects, using, batch_size=None, **options):
+    """
+    bulk_create() that keeps the objects' own auto_now_add values, which it
+    replaces with the current time, by writing them back with bulk_update().
+    Call it in a transaction.
+    """
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)]
+    kept = [[getattr(obj, field.attname) for field in fields] for obj in objects]
+    created = model.objects.using(using).bulk_create(objects, batch_size=batch_size, **options)
+    if fields and objects:
+        for obj, values in zip(objects, kept):
+            for field, value in zip(fields, values):
+                setattr(obj, field.attname, value)
+        model.objects.using(using).bulk_update(objects, [field.name for field in fields], batch_size=batch_size)
+    return created
+
+
+def copy_objects(model, objects, using, table=None):
+    # Auto-generated keys (the order line ids) are left to the database.
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and objects and getattr(objects[0], field.attname) is None)
+    ]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        writer.writerow([getattr(obj, field.attname) for field in fields])
+    buffer.seek(0)
+    table = connections[using].ops.quote_name(table or model._meta.db_table)
+    columns = ', '.join(connections[using].ops.quote_name(field.column) for field in fields)
+    sql = f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)'
+    with connections[using].cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            raw_cursor.copy_expert(sql, buffer)
+        else:
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def write_objects(model, objects, using, use_copy, batch_size):
+    objects = list(objects)
+    if use_copy:
+        copy_objects(model, objects, using)
+    else:
+        bulk_create_keeping_dates(model, objects, using, batch_size)
+    return len(objects)
+
+
+def load_orders(options):
+    seed, start, stop, customers, products, lines_per_order, now, using, use_copy, batch_size = options
+    orders, lines = generate_orders(seed, start, stop, customers, products, lines_per_order, now)
+    with transaction.atomic(using=using):
+        write_objects(Order, orders, using, use_copy, batch_size)
+        write_objects(Order.products.through, lines, using, use_copy, batch_size)
+    return len(orders), len(lines)
+
+
+def load_orders_in_worker(options):
+    try:
+        return load_orders(options)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Replaces the shop data with a deterministic synthetic dataset.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=3)
+        parser.add_argument('--customers', type=int, default=3)
+        parser.add_argument('--orders', type=int, default=3)
+        parser.add_argument('--lines-per-order', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--copy', action='store_true', help='Load with COPY (PostgreSQL only).')
+        parser.add_argument('--workers', type=int, default=1, help='Order loading processes (PostgreSQL only).')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        products, customers, orders = options['products'], options['customers'], options['orders']
+        batch_size = options['batch_size']
+        if min(products, customers, orders, options['lines_per_order']) < 0:
+            raise CommandError('Counts must not be negative.')
+        if batch_size < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive.')
+        if orders and not (products and customers):
+            raise CommandError('Orders need at least one product and one customer.')
+        if connection.vendor != 'postgresql' and (options['copy'] or options['workers'] > 1):
+            raise CommandError('--copy and --workers are only supported on PostgreSQL.')
+
+        started = time.perf_counter()
+        models = [Product, Customer, Order, Order.products.through]
+        tables = [model._meta.db_table for model in models]
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, allow_cascade=True))
+
+        for model, generate, count in ((Product, generate_products, products), (Customer, generate_customers, customers)):
+            for start in range(1, count + 1, batch_size):
+                stop = min(start + batch_size, count + 1)
+                with transaction.atomic(using=using):
+                    write_objects(model, generate(options['seed'], start, stop), using, options['copy'], batch_size)
+
+        now = timezone.now()
+        chunks = [
+            (options['seed'], start, min(start + batch_size, orders + 1), customers, products,
+             options['lines_per_order'], now, using, options['copy'], batch_size)
+            for start in range(1, orders + 1, batch_size)
+        ]
+        if options['workers'] > 1:
+            connections.close_all()
+            # Spawned rather than forked, as process_jobs does, so that the
+            # workers share no connections or other state with this process.
+            database_names = {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+            with multiprocessing.get_context('spawn').Pool(
+                options['workers'], initializer=setup_worker_process, initargs=(database_names,)
+            ) as pool:
+                results = pool.map(load_orders_in_worker, chunks)
+        else:
+            results = [load_orders(chunk) for chunk in chunks]
+        lines = sum(line_count for _, line_count in results)
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+        get_search_backend(using).reindex(using)
+        rebuild_sales_aggregates(using)
+        invalidate_all_responses()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Created {products} products, {customers} customers, {orders} orders "
+            f"and {lines} order lines in {elapsed:.1f}s."
         )
-        order3.products.add(product1, product3)
-        
-        self.stdout.write("Data created successfully.")
\ No newline at end of file
+        self.stdout.write("Data created successfully.")
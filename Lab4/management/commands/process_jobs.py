@@ -0,0 +1,90 @@
+import multiprocessing
+import signal
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from Lab4.jobs import claim_jobs, requeue_abandoned, run_claimed_job
+from Lab4.workers import setup_worker_process
+
+
+# Seconds between checks for jobs whose worker died while running them.
+REQUEUE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs queued background jobs on a pool of threads or processes. Several '
+        'of these can run at once against the same database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Jobs run at once (default JOB_WORKERS).')
+        parser.add_argument('--pool', choices=('thread', 'process'), default='thread')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls of an empty queue.')
+        parser.add_argument('--once', action='store_true', help='Exit once no jobs are ready to run.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or getattr(settings, 'JOB_WORKERS', 4)
+        using = options['database']
+        self.stopping = threading.Event()
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            outcomes = self.process(self.executor(options['pool'], workers), workers, using, options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+        summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items()))
+        self.stdout.write(f"Processed {sum(outcomes.values())} jobs ({summary or 'none'}).")
+
+    def stop(self, signum, frame):
+        self.stderr.write('Stopping once the running jobs finish.')
+        self.stopping.set()
+
+    def executor(self, pool, workers):
+        if pool == 'thread':
+            return ThreadPoolExecutor(workers, thread_name_prefix='lab4-job')
+        # Workers are spawned rather than forked: the pool starts them on
+        # demand, by which time the parent has open database connections
+        # that forked children would share.
+        database_names = {alias: connections[alias].settings_dict['NAME'] for alias in connections}
+        return ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=setup_worker_process, initargs=(database_names,),
+        )
+
+    def process(self, executor, workers, using, options):
+        outcomes = Counter()
+        running = set()
+        next_requeue = 0
+        with executor:
+            while not self.stopping.is_set():
+                if time.monotonic() >= next_requeue:
+                    requeue_abandoned(using)
+                    next_requeue = time.monotonic() + REQUEUE_INTERVAL
+                claimed = claim_jobs(workers - len(running), using) if len(running) < workers else []
+                running.update(executor.submit(run_claimed_job, pk, using) for pk in claimed)
+                if not running:
+                    if options['once']:
+                        break
+                    self.stopping.wait(options['poll_interval'])
+                    continue
+                done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                outcomes.update(self.outcome(future) for future in done)
+            done, _ = wait(running)
+            outcomes.update(self.outcome(future) for future in done)
+        return outcomes
+
+    def outcome(self, future):
+        try:
+            return future.result()
+        except Exception as exc:
+            # The job could not be recorded either; it is requeued once its
+            # claim times out.
+            self.stderr.write(f'Worker error: {exc!r}')
+            return 'error'
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from Lab4.aggregates import rebuild_sales_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily sales and product sales summary tables from the orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        days, products = rebuild_sales_aggregates(options['database'])
+        self.stdout.write(f'Rebuilt {days} daily sales rows and {products} product sales rows.')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from Lab4.search import get_search_backend
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index from the product table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        get_search_backend(options['database']).reindex(options['database'])
+        self.stdout.write("Search index rebuilt.")
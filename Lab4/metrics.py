@@ -0,0 +1,86 @@
+import threading
+from bisect import bisect_left
+
+_lock = threading.Lock()
+_collectors = []
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels) + '}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        with _lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with _lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('+inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('+inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{format_labels(labels + [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+def register_collector(collector):
+    """Registers a callable returning Prometheus text lines for /metrics."""
+    _collectors.append(collector)
+    return collector
+
+
+def render_metrics():
+    lines = []
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+
+request_duration = Histogram(
+    'lab4_request_duration_seconds', 'Wall time spent handling a request.', ('view', 'method'), DURATION_BUCKETS
+)
+request_db_duration = Histogram(
+    'lab4_request_db_duration_seconds', 'Time spent in SQL queries per request.', ('view',), DURATION_BUCKETS
+)
+request_serialize_duration = Histogram(
+    'lab4_request_serialize_duration_seconds', 'Time spent turning objects into response data, less its queries.',
+    ('view',), DURATION_BUCKETS
+)
+request_render_duration = Histogram(
+    'lab4_request_render_duration_seconds', 'Time spent rendering the response body.', ('view',), DURATION_BUCKETS
+)
+request_queries = Histogram(
+    'lab4_request_queries', 'SQL queries executed per request.', ('view',), QUERY_BUCKETS
+)
+
+for histogram in (
+    request_duration, request_db_duration, request_serialize_duration, request_render_duration, request_queries
+):
+    register_collector(histogram.collect)
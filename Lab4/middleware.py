@@ -0,0 +1,172 @@
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+from . import metrics
+from .routers import get_replicas, is_pinned, pin_to_primary, replica_reads
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+# The RequestTiming of the request being handled, when it is sampled.
+_current_timing = ContextVar('lab4_request_timing', default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = QueryTimer()
+        self.render_started = None
+        self.render_duration = 0.0
+        self.serialize_duration = 0.0
+        self.serializing = False
+
+    def rendered(self, response):
+        self.render_duration = time.perf_counter() - self.render_started
+        return response
+
+
+@contextmanager
+def serializing():
+    """
+    Counts the time spent in the block, less its queries, as the sampled
+    request's serializer time. Nested blocks are counted once.
+    """
+    timing = _current_timing.get()
+    if timing is None or timing.serializing:
+        yield
+        return
+    timing.serializing = True
+    started, db_started = time.perf_counter(), timing.queries.duration
+    try:
+        yield
+    finally:
+        timing.serializing = False
+        elapsed = time.perf_counter() - started
+        timing.serialize_duration += max(elapsed - (timing.queries.duration - db_started), 0)
+
+
+class RequestTimingMiddleware:
+    """
+    Records SQL queries, DB time, serializer time, render time and wall time
+    for a sample of requests (REQUEST_TIMING_SAMPLE_RATE), returns them in a Server-Timing
+    header and aggregates them into the histograms served on /metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 0.0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timing = request.timing = RequestTiming()
+        token = _current_timing.set(timing)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timing.queries))
+                response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        total = time.perf_counter() - timing.started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.request_duration.observe(total, view, request.method)
+        metrics.request_db_duration.observe(timing.queries.duration, view)
+        metrics.request_serialize_duration.observe(timing.serialize_duration, view)
+        metrics.request_render_duration.observe(timing.render_duration, view)
+        metrics.request_queries.observe(timing.queries.count, view)
+
+        app = total - timing.queries.duration - timing.serialize_duration - timing.render_duration
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timing.queries.duration * 1000:.2f};desc="{timing.queries.count} queries"',
+            f'app;dur={max(app, 0) * 1000:.2f}',
+            f'serialize;dur={timing.serialize_duration * 1000:.2f}',
+            f'render;dur={timing.render_duration * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        return response
+
+    def process_template_response(self, request, response):
+        timing = getattr(request, 'timing', None)
+        if timing is not None:
+            timing.render_started = time.perf_counter()
+            response.add_post_render_callback(timing.rendered)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe-method requests under REPLICA_READ_PATHS read from the
+    DATABASE_REPLICAS. A client that writes is pinned to the primary for
+    REPLICA_PIN_SECONDS so it always reads its own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.paths = tuple(getattr(settings, 'REPLICA_READ_PATHS', ('/api/',)))
+
+    def __call__(self, request):
+        if request.method not in SAFE_METHODS:
+            try:
+                return self.get_response(request)
+            finally:
+                pin_to_primary(request)
+
+        if not request.path.startswith(self.paths) or is_pinned(request):
+            return self.get_response(request)
+        with replica_reads():
+            response = self.get_response(request)
+        if response.streaming and not response.is_async:
+            # Streamed bodies run their queries after the view has returned.
+            response.streaming_content = self.stream(response.streaming_content)
+        return response
+
+    def stream(self, content):
+        with replica_reads():
+            yield from content
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Adds X-RateLimit-Limit, X-RateLimit-Remaining and X-RateLimit-Reset
+    (seconds until the bucket is full again) to responses from views
+    limited by a Lab4.throttling throttle.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            limit, remaining, reset = rate_limit
+            response.headers.setdefault('X-RateLimit-Limit', str(limit))
+            response.headers.setdefault('X-RateLimit-Remaining', str(remaining))
+            response.headers.setdefault('X-RateLimit-Reset', str(reset))
+        return response
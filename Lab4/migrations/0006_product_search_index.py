@@ -0,0 +1,39 @@
+from django.db import migrations
+
+FTS_TABLE = 'lab4_product_fts'
+TRIGRAM_INDEX = 'lab4_product_name_trgm'
+
+
+def create_search_index(apps, schema_editor):
+    Product = apps.get_model('Lab4', 'Product')
+    table = schema_editor.quote_name(Product._meta.db_table)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON {table} USING gin (UPPER(name) gin_trgm_ops)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, tokenize='trigram')"
+        )
+        schema_editor.execute(f'INSERT INTO {FTS_TABLE} (rowid, name) SELECT id, name FROM {table}')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lab4', '0005_alter_customer_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:29
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_sales_aggregates(apps, schema_editor):
+    using = schema_editor.connection.alias
+    Order = apps.get_model('Lab4', 'Order')
+    DailySales = apps.get_model('Lab4', 'DailySales')
+    ProductSales = apps.get_model('Lab4', 'ProductSales')
+    OrderLine = Order.products.through
+
+    daily = {}
+    orders = Order.objects.using(using).annotate(day=TruncDate('date')).values('status', 'day')
+    for row in orders.annotate(orders=Count('pk')).order_by():
+        daily[row['status'], row['day']] = [row['orders'], Decimal('0.00')]
+    lines = OrderLine.objects.using(using).annotate(status=F('order__status'), day=TruncDate('order__date'))
+    for row in lines.values('status', 'day').annotate(revenue=Sum('product__price')).order_by():
+        daily[row['status'], row['day']][1] = row['revenue'] or Decimal('0.00')
+    DailySales.objects.using(using).bulk_create([
+        DailySales(status=status, day=day, orders=count, revenue=revenue)
+        for (status, day), (count, revenue) in daily.items()
+    ], batch_size=1000)
+    units = OrderLine.objects.using(using).values('product_id').annotate(units=Count('pk')).order_by()
+    ProductSales.objects.using(using).bulk_create(
+        [ProductSales(product_id=row['product_id'], units=row['units']) for row in units], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lab4', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('New', 'New'), ('In Process', 'In Process'), ('Sent', 'Sent'), ('Completed', 'Completed')], max_length=50)),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='lab4_dailysales_day')],
+                'constraints': [models.UniqueConstraint(fields=('status', 'day'), name='lab4_dailysales_status_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='Lab4.product')),
+                ('units', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-units'], name='lab4_productsales_units')],
+            },
+        ),
+        migrations.RunPython(populate_sales_aggregates, migrations.RunPython.noop),
+    ]
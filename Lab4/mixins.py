@@ -0,0 +1,233 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import router, transaction
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from .cache import get_response_cache, get_response_cache_timeout, record_lookup, response_key
+from .export import EXPORT_FORMATS, stream_export
+from .middleware import serializing
+from .representation import plain_columns, represent_rows, value_columns
+from .routers import replica_may_be_stale
+
+class BulkModelMixin:
+    """
+    POST, PATCH and DELETE a list payload on `<prefix>/bulk/` to create,
+    update or delete many objects in one transaction. `?batch_size=` caps the
+    rows written per statement.
+    """
+
+    def get_batch_size(self):
+        value = self.request.query_params.get('batch_size') if self.request else None
+        if value is None:
+            return None
+        try:
+            return serializers.IntegerField(min_value=1).run_validation(value)
+        except ValidationError as exc:
+            raise ValidationError({'batch_size': exc.detail})
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['batch_size'] = self.get_batch_size()
+        return context
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        if request.method == 'POST':
+            return self.bulk_create(request)
+        if request.method == 'PATCH':
+            return self.bulk_update(request)
+        return self.bulk_destroy(request)
+
+    def bulk_create(self, request):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        instances = serializer.save()
+        return Response(
+            {'count': len(instances), 'ids': [instance.pk for instance in instances]},
+            status=status.HTTP_201_CREATED
+        )
+
+    def bulk_update(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        ids = [item['id'] for item in request.data if isinstance(item, dict) and isinstance(item.get('id'), int)]
+        instances = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(instances, data=request.data, many=True, partial=True)
+        serializer.is_valid(raise_exception=True)
+        updated = serializer.save()
+        return Response({'count': len(updated)})
+
+    def bulk_destroy(self, request):
+        field = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+        ids = field.run_validation(request.data)
+        queryset = self.get_queryset()
+        using = router.db_for_write(queryset.model)
+        with transaction.atomic(using=using):
+            _, deleted = queryset.filter(pk__in=ids).delete()
+        return Response({'count': deleted.get(queryset.model._meta.label, 0)})
+
+class ExportMixin:
+    """
+    Streams every object as CSV or NDJSON from `<prefix>/export/<format>/`,
+    honouring the viewset's filters but not its pagination.
+    """
+
+    @action(detail=False, methods=['get'], url_path='export/(?P<export_format>csv|ndjson)')
+    def export(self, request, export_format, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            stream_export(queryset, self.get_serializer, export_format),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        filename = f'{queryset.model._meta.verbose_name_plural}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+def ordering_fields(view, queryset):
+    """The model fields the view's cursor pagination orders by."""
+    get_ordering = getattr(view.paginator, 'get_ordering', None)
+    if get_ordering is None:
+        return []
+    names = [name.lstrip('-') for name in get_ordering(view.request, queryset, view)]
+    return [queryset.model._meta.get_field(name) for name in names if name not in queryset.query.annotations]
+
+class SparseFieldsMixin:
+    """
+    `?fields=` and `?omit=` (comma-separated) choose the fields GET requests
+    return. Only their columns are selected, and relations that are not
+    returned are neither joined nor prefetched.
+    """
+    sparse_fields_params = ('fields', 'omit')
+
+    @cached_property
+    def sparse_fields(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None
+        available = list(self.get_serializer_class()().fields)
+        selected = None
+        for param in self.sparse_fields_params:
+            value = self.request.query_params.get(param, '')
+            names = {name.strip() for name in value.split(',') if name.strip()}
+            unknown = names - set(available)
+            if unknown:
+                raise ValidationError({param: f"Unknown fields: {', '.join(sorted(unknown))}"})
+            if not names:
+                continue
+            selected = selected if selected is not None else set(available)
+            selected = selected & names if param == 'fields' else selected - names
+        return selected
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.sparse_fields is not None:
+            fields = getattr(serializer, 'child', serializer).fields
+            for name in list(fields):
+                if name not in self.sparse_fields:
+                    fields.pop(name)
+        return serializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.sparse_fields is None:
+            return queryset
+        opts = queryset.model._meta
+        serializer_fields = self.get_serializer_class()().fields
+        selected = [
+            opts.get_field(field.source if field.source != '*' else name)
+            for name, field in serializer_fields.items() if name in self.sparse_fields
+        ]
+        queryset = queryset.only(*{
+            field.name for field in [opts.pk, *selected, *ordering_fields(self, queryset)] if field.concrete
+            and not field.many_to_many
+        })
+        # Drop the joins and prefetches of relations that are not returned.
+        names = {field.name for field in selected}
+        select_related = queryset.query.select_related
+        if isinstance(select_related, dict):
+            queryset = queryset.select_related(None)
+            if names & set(select_related):
+                queryset = queryset.select_related(*(names & set(select_related)))
+        lookups = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if getattr(lookup, 'prefetch_through', lookup).split('__')[0] in names
+        ]
+        return queryset.prefetch_related(None).prefetch_related(*lookups)
+
+class ValuesListMixin:
+    """
+    Builds list pages from values_list() rows instead of model instances and
+    per-field ModelSerializer.to_representation calls, rendering the same
+    JSON (with FastJSONRenderer when the fields allow). Views fall back to
+    the serializer where use_values_list() says so.
+    """
+
+    def use_values_list(self):
+        return True
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_values_list():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        model = queryset.model
+        columns, many_to_many = value_columns(model, self.get_serializer().fields)
+        names = [attname for _, attname, _ in columns]
+        # Cursor pagination reads its position from the ordering field, which
+        # may be an annotation such as the search rank.
+        for field in [model._meta.pk, *ordering_fields(self, queryset)]:
+            if field.attname not in names:
+                names.append(field.attname)
+        names += [name for name in queryset.query.annotations if name not in names]
+        # Named rows, so the paginator can read the cursor position by name.
+        rows = queryset.select_related(None).prefetch_related(None).values_list(*names, named=True)
+
+        page = self.paginate_queryset(rows)
+        rows = page if page is not None else list(rows)
+        with serializing():
+            data = represent_rows(rows, columns, many_to_many, names.index(model._meta.pk.attname), queryset.db)
+        response = self.get_paginated_response(data) if page is not None else Response(data)
+        response.plain_json = plain_columns(columns)
+        return response
+
+class CachedResponseMixin:
+    """
+    Serves list and retrieve responses from the response cache. Entries are
+    keyed on the URL and on the versions of the viewset's model (or object)
+    and of `cache_dependencies`, which the model signals bump on every write.
+    """
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, None, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        model = self.queryset.model
+        try:
+            pk = model._meta.pk.to_python(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except DjangoValidationError:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(super().retrieve, pk, request, *args, **kwargs)
+
+    def cached_response(self, handler, object_pk, request, *args, **kwargs):
+        cache = get_response_cache()
+        key = response_key(request, self.queryset.model, object_pk, self.cache_dependencies)
+        entry = cache.get(key)
+        if entry is not None:
+            record_lookup(hit=True)
+            data, plain_json = entry
+            response = Response(data)
+            response.plain_json = plain_json
+            response['X-Cache'] = 'HIT'
+            return response
+        record_lookup(hit=False)
+        response = handler(request, *args, **kwargs)
+        # A replica that lags behind a write would cache the old data under
+        # the new version.
+        if response.status_code == status.HTTP_200_OK and not replica_may_be_stale():
+            entry = (response.data, getattr(response, 'plain_json', False))
+            cache.set(key, entry, get_response_cache_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
@@ -1,4 +1,8 @@
+from decimal import Decimal
 from django.db import models
+from django.utils import timezone
+from django.db.models import Case, Count, DecimalField, F, FilteredRelation, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 
 class Customer(models.Model):
@@ -9,19 +13,84 @@ class Customer(models.Model):
     def __str__(self):
         return self.name
 
+class OutOfStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f'Product {product_id} is out of stock.')
+        self.product_id = product_id
+
+class ProductQuerySet(models.QuerySet):
+    def reserve(self, quantities):
+        """
+        Takes {product id: units} out of stock, or raises OutOfStock. Each
+        product is one conditional UPDATE, so concurrent reservations never
+        take the same units, and products are updated in id order so that
+        transactions reserving several cannot deadlock. Call it in a
+        transaction, which the row locks last until. Returns the ids of the
+        products whose stock changed; untracked products are left alone.
+        """
+        tracked = self.filter(pk__in=quantities, stock__isnull=False).values_list('pk', flat=True)
+        reserved = sorted(tracked)
+        for pk in reserved:
+            quantity = quantities[pk]
+            updated = self.filter(pk=pk, stock__gte=quantity).update(
+                stock=F('stock') - quantity,
+                available=Q(stock__gt=quantity),
+            )
+            if not updated:
+                raise OutOfStock(pk)
+        return reserved
+
 class Product(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     available = models.BooleanField(default=True)
+    # None when stock is not tracked; otherwise available follows it.
+    stock = models.PositiveIntegerField(null=True, blank=True)
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.stock is not None:
+            self.available = self.stock > 0
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'stock' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'available'}
+        super().save(*args, **kwargs)
+
     def clean(self):
         if self.price <= 0:
             raise ValidationError('Price must be positive')
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        return self.annotate(
+            order_total=Coalesce(
+                Sum('products__price'),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+            unavailable_products=Count('products', filter=Q(products__available=False)),
+        ).annotate(
+            fulfillable=Case(
+                When(unavailable_products=0, then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+    def blocking_products(self):
+        """
+        (order id, unavailable product id) rows for every order, with None as
+        the product for orders that can be fulfilled, ordered by order.
+        """
+        return self.annotate(
+            blocking=FilteredRelation('products', condition=Q(products__available=False)),
+        ).order_by('pk', 'blocking__pk').values_list('pk', 'blocking__pk')
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('New', 'New'),
@@ -30,17 +99,84 @@ class Order(models.Model):
         ('Completed', 'Completed'),
     ]
 
+    # The order a status change job may move an order in.
+    STATUS_TRANSITIONS = {'New': 'In Process', 'In Process': 'Sent', 'Sent': 'Completed'}
+
     id = models.AutoField(primary_key=True)
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    # Indexed through lab4_order_customer_date, which leads with customer.
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
     products = models.ManyToManyField(Product)
     date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='lab4_order_date'),
+            models.Index(fields=['status', 'date', 'id'], name='lab4_order_status_date'),
+            models.Index(fields=['customer', 'date', 'id'], name='lab4_order_customer_date'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.customer.name}"
 
     def total_price(self):
+        if hasattr(self, 'order_total'):
+            return self.order_total
         return sum(product.price for product in self.products.all())
 
     def can_be_fulfilled(self):
-        return all(product.available for product in self.products.all())
\ No newline at end of file
+        if hasattr(self, 'fulfillable'):
+            return self.fulfillable
+        return all(product.available for product in self.products.all())
+
+class DailySales(models.Model):
+    status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES)
+    day = models.DateField()
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['status', 'day'], name='lab4_dailysales_status_day')]
+        indexes = [models.Index(fields=['day'], name='lab4_dailysales_day')]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.orders} orders, {self.revenue}"
+
+class ProductSales(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['-units'], name='lab4_productsales_units')]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.units} units"
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    # Not picked up before this time, which retries push back.
+    run_at = models.DateTimeField(default=timezone.now)
+    # The claim that owns a running job, and when it was made.
+    claimed_by = models.CharField(max_length=100, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at', 'id'], name='lab4_job_status_run_at')]
+
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
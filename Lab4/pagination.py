@@ -0,0 +1,232 @@
+import datetime
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+def estimated_count(queryset, timeout=60):
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    key = 'lab4:count:' + hashlib.md5(f'{queryset.db}:{sql}:{params!r}'.encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+def keyset_filter(ordering, values):
+    """The rows that come after `values` in `ordering`."""
+    condition = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        clause = Q(**{f"{name}__{'lt' if field.startswith('-') else 'gt'}": values[index]})
+        for previous, value in zip(ordering[:index], values):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Paginator that counts exactly only when the planner estimates fewer
+    than `exact_count_limit` rows, and trusts the estimate above that.
+    """
+    exact_count_limit = 10000
+    count_cache_timeout = 60
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list, self.count_cache_timeout)
+        if estimate < self.exact_count_limit:
+            return super().count
+        return estimate
+
+
+class IdCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    count_query_param = 'count'
+    count_cache_timeout = 60
+
+    def get_ordering(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', 'id')
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = estimated_count(queryset, self.count_cache_timeout)
+        ordering = self.get_ordering(request, queryset, view)
+        if len(ordering) == 1:
+            return super().paginate_queryset(queryset, request, view)
+        return self.paginate_keyset(queryset, request, ordering)
+
+    def paginate_keyset(self, queryset, request, ordering):
+        # DRF positions cursors on the first ordering field alone and steps
+        # over ties with an offset capped at offset_cutoff, which loops on
+        # runs of equal search ranks or dates. Positions here hold every
+        # ordering field, so they are unique and the offset is always 0.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = ordering
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(keyset_filter(ordering, self.decode_position(queryset, position)))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = position is not None, position
+            self.has_previous, self.previous_position = following_position is not None, following_position
+        else:
+            self.has_next, self.next_position = following_position is not None, following_position
+            self.has_previous, self.previous_position = position is not None, position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def decode_position(self, queryset, position):
+        annotations = queryset.query.annotations
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError(position)
+            values = [
+                (annotations[name].output_field if name in annotations else queryset.model._meta.get_field(name))
+                .to_python(value)
+                for name, value in zip((field.lstrip('-') for field in self.ordering), values)
+            ]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _get_position_from_instance(self, instance, ordering):
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+        values = [
+            instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            for name in (field.lstrip('-') for field in ordering)
+        ]
+        # Full precision: DjangoJSONEncoder would drop the microseconds.
+        return json.dumps([value.isoformat() if isinstance(value, datetime.date) else value for value in values])
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count'] = {
+            'type': 'integer',
+            'example': 123,
+            'description': 'Estimated number of rows, only present when requested.',
+        }
+        return schema
+
+
+class OrderCursorPagination(IdCursorPagination):
+    ordering = ('-date', '-id')
+
+
+class KeysetPage:
+    """
+    A page of `queryset` in primary key order addressed by `?after=<pk>` or
+    `?before=<pk>` rather than a page number, so any page costs one index
+    range scan and no count. Rows are read when the page is first used.
+    """
+
+    def __init__(self, queryset, page_size, params):
+        self.queryset = queryset.order_by('pk')
+        self.page_size = page_size
+        self.after = self.parse(params, 'after')
+        self.before = None if self.after is not None else self.parse(params, 'before')
+
+    @staticmethod
+    def parse(params, name):
+        value = params.get(name)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise Http404(f'Invalid {name} cursor.')
+
+    @property
+    def cursor(self):
+        if self.after is not None:
+            return f'after:{self.after}'
+        return f'before:{self.before}' if self.before is not None else ''
+
+    def fetch(self, queryset):
+        rows = list(queryset[:self.page_size + 1])
+        return rows[:self.page_size], len(rows) > self.page_size
+
+    @cached_property
+    def page(self):
+        if self.before is not None:
+            rows, more = self.fetch(self.queryset.filter(pk__lt=self.before).reverse())
+            if more:
+                return rows[::-1], True, True
+        # Paging back past the start shows the first page.
+        queryset = self.queryset.filter(pk__gt=self.after) if self.after is not None else self.queryset
+        rows, more = self.fetch(queryset)
+        return rows, self.after is not None, more
+
+    @property
+    def object_list(self):
+        return self.page[0]
+
+    def has_previous(self):
+        return self.page[1]
+
+    def has_next(self):
+        return self.page[2]
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def previous_before(self):
+        # Past the last row, the previous page ends at the cursor.
+        return self.object_list[0].pk if self.object_list else self.after + 1
+
+    def next_after(self):
+        return self.object_list[-1].pk
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
@@ -0,0 +1,30 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renders responses marked `plain_json`, whose data holds only dicts,
+    lists, strings, integers, booleans and None, with orjson. For those types
+    its output is byte-for-byte the compact, non-ASCII-escaping JSON that
+    JSONRenderer produces; anything else is left to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        response = renderer_context.get('response')
+        if (
+            data is None
+            or not getattr(response, 'plain_json', False)
+            or self.get_indent(accepted_media_type, renderer_context)
+            or self.ensure_ascii
+            or not self.compact
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits.
+            return super().render(data, accepted_media_type, renderer_context)
+        # As JSONRenderer does, for embedding in JavaScript.
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
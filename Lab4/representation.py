@@ -0,0 +1,124 @@
+import datetime
+
+from rest_framework import ISO_8601
+from rest_framework import fields
+from rest_framework.relations import RelatedField
+from rest_framework.settings import api_settings
+
+# Fields whose to_representation() returns the value unchanged for what the
+# database backends return: int, str, bool.
+PASSTHROUGH = {
+    fields.IntegerField.to_representation,
+    fields.CharField.to_representation,
+    fields.ChoiceField.to_representation,
+    fields.BooleanField.to_representation,
+}
+
+
+def decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or not field.decimal_places:
+        return field.to_representation
+    places = field.decimal_places
+
+    def convert(value):
+        # A value read from a column with the field's decimal places is
+        # already quantized, and str() then writes it in fixed point.
+        text = str(value)
+        digits = len(text) - 1 - (text[0] == '-')
+        if text[-places - 1:-places] == '.' and (field.max_digits is None or digits <= field.max_digits):
+            return text
+        return field.to_representation(value)
+    convert.returns_str = True
+    return convert
+
+
+def datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    is_utc = timezone is datetime.timezone.utc or getattr(timezone, 'key', None) == 'UTC'
+    if output_format is None or output_format.lower() != ISO_8601 or not is_utc:
+        return field.to_representation
+
+    def convert(value):
+        # The backends return UTC datetimes when the connection is in UTC.
+        if value.tzinfo is datetime.timezone.utc:
+            return value.isoformat()[:-6] + 'Z'
+        return field.to_representation(value)
+    convert.returns_str = True
+    return convert
+
+
+def converter(field):
+    """
+    A function equivalent to field.to_representation() for non-null values
+    read with values_list(), or None where the value is rendered as it is.
+    """
+    # Related fields are read as the primary key the API renders.
+    if isinstance(field, RelatedField) or type(field).to_representation in PASSTHROUGH:
+        return None
+    if type(field).to_representation is fields.DecimalField.to_representation:
+        return decimal_converter(field)
+    if type(field).to_representation is fields.DateTimeField.to_representation:
+        return datetime_converter(field)
+    return field.to_representation
+
+
+def plain_columns(columns):
+    """Whether the columns only hold strings, integers, booleans and None."""
+    return all(convert is None or getattr(convert, 'returns_str', False) for _, _, convert in columns)
+
+
+def value_columns(model, serializer_fields):
+    """
+    Splits serializer fields into (name, attname, converter) columns read
+    with values_list() and (name, model_field) many-to-many fields loaded
+    separately.
+    """
+    opts = model._meta
+    columns, many_to_many = [], []
+    for name, field in serializer_fields.items():
+        model_field = opts.get_field(field.source if field.source != '*' else name)
+        if model_field.many_to_many:
+            many_to_many.append((name, model_field))
+        else:
+            columns.append((name, model_field.attname, converter(field)))
+    return columns, many_to_many
+
+
+def related_ids(model_field, pks, using):
+    through = model_field.remote_field.through
+    source, target = model_field.m2m_column_name(), model_field.m2m_reverse_name()
+    lines = {}
+    rows = (
+        through.objects.using(using).filter(**{f'{source}__in': pks})
+        .order_by(source, target).values_list(source, target)
+    )
+    for pk, related_pk in rows:
+        lines.setdefault(pk, []).append(related_pk)
+    return lines
+
+
+def represent_rows(rows, columns, many_to_many, pk_index, using):
+    """
+    The serializer's representation of values_list() rows that start with
+    the columns, with each many-to-many field's ids loaded in one query.
+    """
+    lines = {}
+    if many_to_many:
+        pks = [row[pk_index] for row in rows]
+        lines = {name: related_ids(model_field, pks, using) for name, model_field in many_to_many}
+    names = [name for name, _, _ in columns]
+    converters = [(name, convert) for name, _, convert in columns if convert is not None]
+    records = []
+    for row in rows:
+        # zip() stops at the last column, before any extra values.
+        record = dict(zip(names, row))
+        for name, convert in converters:
+            value = record[name]
+            if value is not None:
+                record[name] = convert(value)
+        for name, _ in many_to_many:
+            record[name] = lines[name].get(row[pk_index], [])
+        records.append(record)
+    return records
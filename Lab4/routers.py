@@ -0,0 +1,86 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Set by ReplicaRoutingMiddleware for the duration of a request that may read
+# from a replica; everything else (writes, admin, commands) uses the primary.
+_replica_reads = ContextVar('lab4_replica_reads', default=False)
+
+LAST_WRITE_KEY = 'lab4:replica:last-write'
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def get_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reading_from_replicas():
+    return _replica_reads.get() and bool(get_replicas())
+
+
+def pin_key(request):
+    # The credential the client sends, not the user it resolves to: routing
+    # is decided before authentication runs, and without a query.
+    credential = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return 'lab4:replica:pin:' + hashlib.md5(credential.encode()).hexdigest()
+
+
+def pin_to_primary(request):
+    """Sends the client's reads to the primary until replicas have caught up with its write."""
+    seconds = get_pin_seconds()
+    cache.set_many({pin_key(request): True, LAST_WRITE_KEY: True}, seconds)
+
+
+def is_pinned(request):
+    return bool(cache.get(pin_key(request)))
+
+
+def replica_may_be_stale():
+    """True when this request reads from a replica that may not have the latest write yet."""
+    return reading_from_replicas() and bool(cache.get(LAST_WRITE_KEY))
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random DATABASE_REPLICAS alias while replica_reads() is
+    active and everything else to 'default'. Replicas are never migrated;
+    they receive the schema from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        replicas = get_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in get_replicas() else None
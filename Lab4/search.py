@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+FTS_TABLE = 'lab4_product_fts'
+TRIGRAM_INDEX = 'lab4_product_name_trgm'
+
+
+class IContainsSearchBackend:
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(name__icontains=term)
+        return queryset
+
+    def index_product(self, product, using):
+        self.index_products([product], using)
+
+    def index_products(self, products, using):
+        pass
+
+    def remove_product(self, product, using):
+        pass
+
+    def reindex(self, using):
+        pass
+
+
+class TrigramSearchBackend(IContainsSearchBackend):
+    # UPPER(name) LIKE UPPER('%term%') is answered from the GIN trigram index
+    # created in migration 0006.
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        queryset = super().search(queryset, terms)
+        return queryset.annotate(search_rank=TrigramSimilarity('name', ' '.join(terms)))
+
+
+class FTS5SearchBackend(IContainsSearchBackend):
+    # The trigram tokenizer cannot match terms shorter than three characters.
+    min_term_length = 3
+
+    def search(self, queryset, terms):
+        if any(len(term) < self.min_term_length for term in terms):
+            return super().search(queryset, terms).annotate(search_rank=Value(0.0, output_field=FloatField()))
+        match = ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+        table = queryset.model._meta.db_table
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        # LIMIT -1 keeps SQLite from flattening the ranked matches into the
+        # correlated lookup: they are computed once and indexed by rowid,
+        # rather than MATCH being evaluated again for every product.
+        rank = RawSQL(
+            f'SELECT search_rank FROM (SELECT rowid AS product_id, -rank AS search_rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s LIMIT -1) WHERE product_id = "{table}"."id"',
+            (match,), output_field=FloatField(),
+        )
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+    def index_products(self, products, using):
+        with connections[using].cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[product.pk] for product in products])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name) VALUES (%s, %s)',
+                [[product.pk, product.name] for product in products]
+            )
+
+    def remove_product(self, product, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+
+    def reindex(self, using):
+        from .models import Product
+
+        table = Product._meta.db_table
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, name) SELECT id, name FROM "{table}"')
+
+
+SEARCH_BACKENDS = {
+    'postgresql': 'Lab4.search.TrigramSearchBackend',
+    'sqlite': 'Lab4.search.FTS5SearchBackend',
+}
+
+
+def get_search_backend(using='default'):
+    backends = {**SEARCH_BACKENDS, **getattr(settings, 'PRODUCT_SEARCH_BACKENDS', {})}
+    path = backends.get(connections[using].vendor, 'Lab4.search.IContainsSearchBackend')
+    return import_string(path)()
@@ -1,17 +1,294 @@
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import router, transaction
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Product, Customer, Order
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .models import Product, Customer, Order, DailySales, ProductSales, Job, OutOfStock
+from .authentication import STAFF_CLAIM
+from .cache import bump_versions
+from .middleware import serializing
+from .signals import bulk_saved, bulk_saving
 
-class ProductSerializer(serializers.ModelSerializer):
-  class Meta: 
+def reserve_stock(orders, using):
+    """
+    Reserves a unit of each product of `orders` (lists of products) in the
+    current transaction. An order holds a product once however often its
+    payload lists it.
+    """
+    quantities = Counter(pk for products in orders for pk in {product.pk for product in products})
+    try:
+        reserved = Product.objects.using(using).reserve(quantities)
+    except OutOfStock as exc:
+        raise serializers.ValidationError({'products': [str(exc)]})
+    if reserved:
+        bump_versions(Product, reserved, using)
+
+def reserve_added_stock(changes, using):
+    """
+    Reserves stock for the products that `changes`, (order, products) pairs,
+    add to existing orders. The orders stay locked until the transaction
+    ends, so concurrent updates cannot both count a product as added.
+    """
+    ids = sorted(order.pk for order, _ in changes)
+    list(Order.objects.using(using).select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk'))
+    held = set(Order.products.through.objects.using(using).filter(order_id__in=ids).values_list('order_id', 'product_id'))
+    reserve_stock([
+        [product for product in products if (order.pk, product.pk) not in held] for order, products in changes
+    ], using)
+
+class TimedDataMixin:
+    # Reported as the serializer time of sampled requests.
+    @property
+    def data(self):
+        with serializing():
+            return super().data
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Resolves ids from the objects BulkListSerializer loaded with one in_bulk()
+    # per related model instead of one get() per item.
+    def to_internal_value(self, data):
+        related_objects = getattr(self.root, 'related_objects', None)
+        model = self.get_queryset().model
+        if related_objects is None or model not in related_objects:
+            return super().to_internal_value(data)
+        try:
+            pk = model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in related_objects[model]:
+            self.fail('does_not_exist', pk_value=data)
+        return related_objects[model][pk]
+
+class BulkListSerializer(TimedDataMixin, serializers.ListSerializer):
+    def get_batch_size(self):
+        return self.context.get('batch_size') or getattr(settings, 'BULK_BATCH_SIZE', 1000)
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.related_objects = self.load_related_objects(data)
+        return super().to_internal_value(data)
+
+    def load_related_objects(self, data):
+        ids = {}
+        querysets = {}
+        for name, field in self.child.fields.items():
+            if field.read_only:
+                continue
+            relation = getattr(field, 'child_relation', field)
+            if not isinstance(relation, BulkPrimaryKeyRelatedField):
+                continue
+            queryset = relation.get_queryset()
+            querysets[queryset.model] = queryset
+            for item in data:
+                value = item.get(name) if isinstance(item, dict) else None
+                values = value if isinstance(value, list) else [value]
+                for pk in values:
+                    try:
+                        ids.setdefault(queryset.model, set()).add(queryset.model._meta.pk.to_python(pk))
+                    except (TypeError, ValueError, DjangoValidationError):
+                        pass
+        return {
+            model: queryset.in_bulk(ids.get(model, set()) - {None})
+            for model, queryset in querysets.items()
+        }
+
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return super().run_child_validation(data)
+        raw_pk = data.get('id') if isinstance(data, dict) else None
+        try:
+            pk = self.child.Meta.model._meta.pk.to_python(raw_pk)
+        except (TypeError, ValueError, DjangoValidationError):
+            pk = None
+        if pk not in self.instance:
+            raise serializers.ValidationError({'id': [f'Object with id={raw_pk} does not exist.']})
+        self.child.instance = self.instance[pk]
+        self.child.initial_data = data
+        validated = super().run_child_validation(data)
+        validated['id'] = pk
+        return validated
+
+    def split_many_to_many(self, validated_data):
+        model = self.child.Meta.model
+        names = [field.name for field in model._meta.many_to_many]
+        return [{name: attrs.pop(name) for name in names if name in attrs} for attrs in validated_data]
+
+    def set_many_to_many(self, instances, relations, using, replace=False):
+        model = self.child.Meta.model
+        for field in model._meta.many_to_many:
+            changed = [
+                (instance, related[field.name])
+                for instance, related in zip(instances, relations)
+                if field.name in related
+            ]
+            if not changed:
+                continue
+            through = field.remote_field.through
+            source = f'{field.m2m_field_name()}_id'
+            target = f'{field.m2m_reverse_field_name()}_id'
+            if replace:
+                through.objects.using(using).filter(**{f'{source}__in': [instance.pk for instance, _ in changed]}).delete()
+            through.objects.using(using).bulk_create(
+                [through(**{source: instance.pk, target: obj.pk}) for instance, objs in changed for obj in objs],
+                batch_size=self.get_batch_size(),
+                ignore_conflicts=True,
+            )
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        using = router.db_for_write(model)
+        relations = self.split_many_to_many(validated_data)
+        instances = [model(**attrs) for attrs in validated_data]
+        with transaction.atomic(using=using):
+            model.objects.using(using).bulk_create(instances, batch_size=self.get_batch_size())
+            self.set_many_to_many(instances, relations, using)
+            bulk_saved.send(sender=model, instances=instances, created=True, using=using)
+        return instances
+
+    def update(self, instances, validated_data):
+        model = self.child.Meta.model
+        using = router.db_for_write(model)
+        relations = self.split_many_to_many(validated_data)
+        updated = []
+        fields = set()
+        for attrs in validated_data:
+            instance = instances[attrs.pop('id')]
+            for name, value in attrs.items():
+                setattr(instance, name, value)
+                fields.add(name)
+            updated.append(instance)
+        with transaction.atomic(using=using):
+            bulk_saving.send(sender=model, instances=updated, using=using)
+            if fields:
+                model.objects.using(using).bulk_update(updated, sorted(fields), batch_size=self.get_batch_size())
+            self.set_many_to_many(updated, relations, using, replace=True)
+            bulk_saved.send(sender=model, instances=updated, created=False, using=using)
+        return updated
+
+class ProductSerializer(TimedDataMixin, serializers.ModelSerializer):
+  class Meta:
     model = Product
     fields = '__all__'
+    list_serializer_class = BulkListSerializer
 
-class CustomerSerializer(serializers.ModelSerializer):
+  def validate(self, attrs):
+    # As Product.save() does, which bulk_update() bypasses.
+    stock = attrs['stock'] if 'stock' in attrs else getattr(self.instance, 'stock', None)
+    if stock is not None:
+      attrs['available'] = stock > 0
+    return attrs
+
+class CustomerSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
+
+class OrderListSerializer(BulkListSerializer):
+    def create(self, validated_data):
+        using = router.db_for_write(Order)
+        with transaction.atomic(using=using):
+            reserve_stock([attrs.get('products', ()) for attrs in validated_data], using)
+            return super().create(validated_data)
+
+    def update(self, instances, validated_data):
+        using = router.db_for_write(Order)
+        changes = [(instances[attrs['id']], attrs['products']) for attrs in validated_data if 'products' in attrs]
+        with transaction.atomic(using=using):
+            if changes:
+                reserve_added_stock(changes, using)
+            return super().update(instances, validated_data)
+
+class OrderSerializer(TimedDataMixin, serializers.ModelSerializer):
+    EXPANDABLE_FIELDS = ('customer', 'products')
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
-class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        list_serializer_class = OrderListSerializer
+
+    def create(self, validated_data):
+        using = router.db_for_write(Order)
+        with transaction.atomic(using=using):
+            reserve_stock([validated_data.get('products', ())], using)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'products' not in validated_data:
+            return super().update(instance, validated_data)
+        using = router.db_for_write(Order)
+        with transaction.atomic(using=using):
+            reserve_added_stock([(instance, validated_data['products'])], using)
+            return super().update(instance, validated_data)
+
+    def validate_status(self, value):
+        # Status changes go through the job queue, which applies
+        # Order.STATUS_TRANSITIONS.
+        if self.instance is not None and value != self.instance.status:
+            url = reverse('order-transition', args=[self.instance.pk])
+            raise serializers.ValidationError(f'Change the status of an existing order with POST {url}.')
+        return value
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        expand = self.context.get('expand', ())
+        if 'customer' in expand and 'customer' in data:
+            data['customer'] = CustomerSerializer(instance.customer, context=self.context).data
+        if 'products' in expand and 'products' in data:
+            data['products'] = ProductSerializer(instance.products.all(), many=True, context=self.context).data
+        return data
+
+class OrderFulfilmentSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, required=False)
+
+class OrderTransitionSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+    def validate_status(self, value):
+        current = self.context['order'].status
+        if value != current and Order.STATUS_TRANSITIONS.get(current) != value:
+            raise serializers.ValidationError(f"An order in status {current} cannot move to {value}.")
+        return value
+
+class JobSerializer(TimedDataMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'payload', 'status', 'attempts', 'max_attempts', 'run_at', 'last_error', 'created',
+            'finished',
+        ]
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['day', 'status', 'orders', 'revenue']
+
+class SalesTotalSerializer(serializers.Serializer):
+    orders = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class StatusSalesSerializer(SalesTotalSerializer):
+    status = serializers.CharField()
+
+class ProductSalesSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='product.name')
+
+    class Meta:
+        model = ProductSales
+        fields = ['product', 'name', 'units']
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    top = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+class StaffClaimTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[STAFF_CLAIM] = user.is_staff
+        return token
@@ -0,0 +1,155 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from .aggregates import add_new_orders, apply_lines, apply_orders, apply_product_lines
+from .authentication import revoke_user_tokens
+from .cache import bump_versions
+from .models import Customer, Order, Product
+from .search import get_search_backend
+
+User = get_user_model()
+
+# Sent after bulk_create/bulk_update, which bypass post_save and m2m_changed.
+bulk_saved = Signal()
+# Sent before bulk writes that may overwrite existing rows.
+bulk_saving = Signal()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, using, **kwargs):
+    get_search_backend(using).index_product(instance, using)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, using, **kwargs):
+    get_search_backend(using).remove_product(instance, using)
+
+
+@receiver(bulk_saved, sender=Product)
+def index_products(sender, instances, using, **kwargs):
+    get_search_backend(using).index_products(instances, using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_responses(sender, instance, using, **kwargs):
+    bump_versions(sender, [instance.pk], using)
+
+
+@receiver(bulk_saved)
+def invalidate_bulk_saved_responses(sender, instances, using, **kwargs):
+    bump_versions(sender, [instance.pk for instance in instances], using)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_order_product_responses(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if reverse and action == 'pre_clear':
+        bump_versions(Order, list(instance.order_set.values_list('pk', flat=True)), using)
+    elif reverse and action in ('post_add', 'post_remove'):
+        bump_versions(Order, pk_set, using)
+    elif not reverse and action.startswith('post_'):
+        bump_versions(Order, [instance.pk], using)
+
+
+@receiver(pre_save, sender=Order)
+def remove_moved_order_sales(sender, instance, using, **kwargs):
+    previous = sender._default_manager.using(using).filter(pk=instance.pk).values('status', 'date').first() \
+        if instance.pk else None
+    instance._sales_moved = bool(previous) and (
+        previous['status'] != instance.status or previous['date'] != instance.date
+    )
+    if instance._sales_moved:
+        apply_orders([instance.pk], -1, using)
+
+
+@receiver(post_save, sender=Order)
+def add_order_sales(sender, instance, created, using, **kwargs):
+    if created:
+        add_new_orders([instance], using)
+    elif getattr(instance, '_sales_moved', False):
+        apply_orders([instance.pk], 1, using)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_deleted_order_sales(sender, instance, using, **kwargs):
+    apply_orders([instance.pk], -1, using)
+
+
+@receiver(pre_save, sender=Product)
+def remove_repriced_product_sales(sender, instance, using, **kwargs):
+    previous = sender._default_manager.using(using).filter(pk=instance.pk).values_list('price', flat=True).first() \
+        if instance.pk else None
+    instance._sales_repriced = previous is not None and previous != instance.price
+    if instance._sales_repriced:
+        apply_product_lines([instance.pk], -1, using)
+
+
+@receiver(post_save, sender=Product)
+def add_repriced_product_sales(sender, instance, using, **kwargs):
+    if getattr(instance, '_sales_repriced', False):
+        apply_product_lines([instance.pk], 1, using)
+
+
+@receiver(pre_delete, sender=Product)
+def remove_deleted_product_sales(sender, instance, using, **kwargs):
+    apply_product_lines([instance.pk], -1, using)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def update_order_line_sales(sender, instance, action, reverse, pk_set, using, **kwargs):
+    column = 'product_id' if reverse else 'order_id'
+    if action == 'post_add':
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        apply_lines(pairs, 1, using)
+    elif action == 'pre_remove':
+        # remove() reports every requested id, present or not.
+        other = 'order_id' if reverse else 'product_id'
+        lines = sender.objects.using(using).filter(**{column: instance.pk, f'{other}__in': pk_set})
+        apply_lines(list(lines.values_list('order_id', 'product_id')), -1, using)
+    elif action == 'pre_clear':
+        lines = sender.objects.using(using).filter(**{column: instance.pk})
+        apply_lines(list(lines.values_list('order_id', 'product_id')), -1, using)
+
+
+@receiver(bulk_saving, sender=Order)
+def remove_bulk_saved_order_sales(sender, instances, using, **kwargs):
+    apply_orders([instance.pk for instance in instances], -1, using)
+
+
+@receiver(bulk_saved, sender=Order)
+def add_bulk_saved_order_sales(sender, instances, using, **kwargs):
+    apply_orders([instance.pk for instance in instances], 1, using)
+
+
+@receiver(bulk_saving, sender=Product)
+def remove_bulk_saved_product_sales(sender, instances, using, **kwargs):
+    apply_product_lines([instance.pk for instance in instances], -1, using)
+
+
+@receiver(bulk_saved, sender=Product)
+def add_bulk_saved_product_sales(sender, instances, using, **kwargs):
+    apply_product_lines([instance.pk for instance in instances], 1, using)
+
+
+@receiver(pre_save, sender=User)
+def detect_user_demotion(sender, instance, **kwargs):
+    previous = sender._default_manager.filter(pk=instance.pk).values('is_active', 'is_staff').first() \
+        if instance.pk else None
+    instance._revoke_tokens = bool(previous) and (
+        (previous['is_active'] and not instance.is_active) or (previous['is_staff'] and not instance.is_staff)
+    )
+
+
+@receiver(post_save, sender=User)
+def revoke_demoted_user_tokens(sender, instance, **kwargs):
+    if getattr(instance, '_revoke_tokens', False):
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
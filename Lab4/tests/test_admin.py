@@ -0,0 +1,104 @@
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from Lab4.admin import OrderAdmin
+from Lab4.aggregates import rebuild_sales_aggregates
+from Lab4.cache import get_versions, version_key
+from Lab4.jobs import claim_jobs, run_job
+from Lab4.models import Product, Customer, Order, DailySales, Job
+from Lab4.pagination import EstimatedCountPaginator
+
+
+class OrderAdminTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client.force_login(self.admin)
+        self.product = Product.objects.create(name='Product', price=Decimal('5.00'))
+
+    def create_orders(self, count):
+        orders = []
+        for index in range(count):
+            customer = Customer.objects.create(name=f'Customer {index}', address='123 Main St')
+            order = Order.objects.create(customer=customer, status='New')
+            order.products.add(self.product)
+            orders.append(order)
+        return orders
+
+    def changelist_queries(self, params=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('admin:Lab4_order_changelist'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.create_orders(2)
+        self.changelist_queries({'status__exact': 'New'})
+        few = self.changelist_queries({'status__exact': 'New'})
+        self.create_orders(10)
+        self.assertEqual(self.changelist_queries({'status__exact': 'New'}), few)
+
+    def test_change_form_uses_autocomplete_widgets(self):
+        order, = self.create_orders(1)
+        Product.objects.create(name='Unrelated product', price=Decimal('1.00'))
+        response = self.client.get(reverse('admin:Lab4_order_change', args=[order.pk]))
+        self.assertContains(response, 'data-ajax--url', count=2)
+        self.assertNotContains(response, 'Unrelated product')
+
+    def test_status_action_queues_transitions(self):
+        orders = self.create_orders(3)
+        Order.objects.filter(pk=orders[2].pk).update(status='Completed')
+        rebuild_sales_aggregates('default')
+        version = get_versions([version_key(Order, orders[0].pk)])
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('admin:Lab4_order_changelist'), {
+                'action': 'mark_in_process',
+                '_selected_action': [order.pk for order in orders],
+            }, follow=True)
+        self.assertContains(response, '2 orders queued to move to In Process.')
+        self.assertContains(response, '1 orders cannot move to In Process from their status.')
+        inserts = [query for query in captured.captured_queries if query['sql'].startswith('INSERT INTO "Lab4_job"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            list(Job.objects.order_by('id').values_list('kind', 'payload')),
+            [('order.transition', {'order': order.pk, 'status': 'In Process'}) for order in orders[:2]],
+        )
+        self.assertEqual(Order.objects.get(pk=orders[0].pk).status, 'New')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual([run_job(pk) for pk in claim_jobs(10, 'default')], ['done', 'done'])
+        self.assertEqual(
+            dict(Order.objects.values_list('pk', 'status')),
+            {orders[0].pk: 'In Process', orders[1].pk: 'In Process', orders[2].pk: 'Completed'},
+        )
+        self.assertNotEqual(get_versions([version_key(Order, orders[0].pk)]), version)
+        rows = {(row.status, row.orders, row.revenue) for row in DailySales.objects.exclude(orders=0)}
+        self.assertEqual(rows, {('In Process', 2, Decimal('10.00')), ('Completed', 1, Decimal('5.00'))})
+
+    def test_status_is_read_only_on_existing_orders(self):
+        self.assertNotIn('mark_new', [action.__name__ for action in OrderAdmin.actions])
+        order, = self.create_orders(1)
+        url = reverse('admin:Lab4_order_change', args=[order.pk])
+        self.assertNotContains(self.client.get(url), 'name="status"')
+        response = self.client.post(url, {
+            'customer': order.customer_id, 'products': [self.product.pk], 'status': 'Completed',
+        })
+        self.assertEqual(response.status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'New')
+        self.assertContains(self.client.get(reverse('admin:Lab4_order_add')), 'name="status"')
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    def test_uses_estimate_only_for_large_tables(self):
+        Product.objects.create(name='Product', price=Decimal('1.00'))
+        with mock.patch('Lab4.pagination.estimated_count', return_value=5):
+            self.assertEqual(EstimatedCountPaginator(Product.objects.all(), 10).count, 1)
+        with mock.patch('Lab4.pagination.estimated_count', return_value=2000000):
+            paginator = EstimatedCountPaginator(Product.objects.all(), 100)
+            self.assertEqual(paginator.count, 2000000)
+            self.assertEqual(paginator.num_pages, 20000)
@@ -0,0 +1,167 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from Lab4.aggregates import rebuild_sales_aggregates
+from Lab4.models import Product, Customer, Order, DailySales, ProductSales
+
+
+class SalesAggregatesTest(TransactionTestCase):
+    # The summary tables are written when each transaction commits.
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.cheap = Product.objects.create(name='Cheap', price=Decimal('2.50'))
+        self.dear = Product.objects.create(name='Dear', price=Decimal('10.00'))
+
+    def snapshot(self):
+        daily = {
+            (row.status, row.day): (row.orders, row.revenue)
+            for row in DailySales.objects.all()
+            if row.orders or row.revenue
+        }
+        units = {row.product_id: row.units for row in ProductSales.objects.all() if row.units}
+        return daily, units
+
+    def assertConsistent(self):
+        incremental = self.snapshot()
+        rebuild_sales_aggregates('default')
+        self.assertEqual(incremental, self.snapshot())
+        return incremental
+
+    def create_order(self, order_status='New', products=()):
+        order = Order.objects.create(customer=self.customer, status=order_status)
+        order.products.add(*products)
+        return order
+
+    def test_order_creation_and_lines(self):
+        order = self.create_order(products=[self.cheap, self.dear])
+        daily, units = self.assertConsistent()
+        self.assertEqual(daily, {('New', order.date.date()): (1, Decimal('12.50'))})
+        self.assertEqual(units, {self.cheap.pk: 1, self.dear.pk: 1})
+
+    def test_status_change_moves_order_and_revenue(self):
+        order = self.create_order(products=[self.dear])
+        order.status = 'Sent'
+        order.save()
+        daily, _ = self.assertConsistent()
+        self.assertEqual(daily, {('Sent', order.date.date()): (1, Decimal('10.00'))})
+
+    def test_line_changes_from_both_sides(self):
+        order = self.create_order(products=[self.cheap])
+        other = self.create_order(order_status='Completed')
+        order.products.remove(self.cheap, self.dear)
+        self.dear.order_set.add(order, other)
+        self.assertConsistent()
+        self.dear.order_set.remove(other)
+        order.products.set([self.cheap])
+        self.assertConsistent()
+        self.cheap.order_set.clear()
+        other.products.add(self.cheap)
+        order.products.clear()
+        daily, units = self.assertConsistent()
+        self.assertEqual(units, {self.cheap.pk: 1})
+
+    def test_price_change_and_deletions(self):
+        order = self.create_order(products=[self.cheap, self.dear])
+        self.create_order(order_status='Sent', products=[self.dear])
+        self.dear.price = Decimal('12.00')
+        self.dear.save()
+        daily, _ = self.assertConsistent()
+        self.assertEqual(daily[('New', order.date.date())], (1, Decimal('14.50')))
+        self.cheap.delete()
+        self.assertConsistent()
+        order.delete()
+        self.customer.delete()
+        self.assertEqual(self.assertConsistent(), ({}, {}))
+
+    def test_rebuild_fixes_drift(self):
+        order = self.create_order(products=[self.cheap])
+        DailySales.objects.update(orders=7, revenue=0)
+        ProductSales.objects.all().delete()
+        stdout = StringIO()
+        call_command('rebuild_sales_aggregates', stdout=stdout)
+        self.assertIn('Rebuilt 1 daily sales rows and 1 product sales rows.', stdout.getvalue())
+        self.assertEqual(self.snapshot(), ({('New', order.date.date()): (1, Decimal('2.50'))}, {self.cheap.pk: 1}))
+
+
+class SalesAggregatesBulkApiTest(TransactionTestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.product = Product.objects.create(name='Product', price=Decimal('4.00'))
+        self.other = Product.objects.create(name='Other', price=Decimal('1.00'))
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def test_bulk_endpoints_keep_aggregates_current(self):
+        url = reverse('order-bulk')
+        response = self.client.post(url, [
+            {'customer': self.customer.pk, 'status': 'Completed', 'products': [self.product.pk]},
+            {'customer': self.customer.pk, 'status': 'New', 'products': [self.other.pk]},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        first, second = response.data['ids']
+        self.client.patch(url, [
+            {'id': first, 'products': [self.other.pk]},
+            {'id': second, 'products': [self.product.pk]},
+        ], format='json')
+        self.client.patch(reverse('product-bulk'), [{'id': self.product.pk, 'price': '6.00'}], format='json')
+        day = Order.objects.get(pk=first).date.date()
+        self.assertEqual(
+            {(row.status, row.orders, row.revenue) for row in DailySales.objects.filter(day=day)},
+            {('New', 1, Decimal('6.00')), ('Completed', 1, Decimal('1.00'))},
+        )
+        self.assertEqual(dict(ProductSales.objects.values_list('product_id', 'units')), {self.product.pk: 1, self.other.pk: 1})
+        self.client.delete(url, [first, second], format='json')
+        self.assertEqual(sum(DailySales.objects.values_list('orders', flat=True)), 0)
+        self.assertEqual(sum(ProductSales.objects.values_list('units', flat=True)), 0)
+
+
+class SalesReportApiTest(TransactionTestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.products = [Product.objects.create(name=f'Product {index}', price=Decimal('3.00')) for index in range(3)]
+        for index, order_status in enumerate(['New', 'New', 'Sent']):
+            order = Order.objects.create(customer=customer, status=order_status)
+            order.products.add(*self.products[:index + 1])
+        self.today = order.date.date()
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def test_report_reads_summary_tables(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('sales_report'), {'top': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totals'], {'orders': 3, 'revenue': '18.00'})
+        self.assertEqual(
+            [dict(row) for row in response.data['by_status']],
+            [{'orders': 2, 'revenue': '9.00', 'status': 'New'}, {'orders': 1, 'revenue': '9.00', 'status': 'Sent'}],
+        )
+        self.assertEqual(response.data['by_day'][0]['day'], self.today.isoformat())
+        self.assertEqual(
+            [(row['product'], row['units']) for row in response.data['top_products']],
+            [(self.products[0].pk, 3), (self.products[1].pk, 2)],
+        )
+
+    def test_report_filters(self):
+        response = self.client.get(reverse('sales_report'), {'status': 'Sent'})
+        self.assertEqual(response.data['totals'], {'orders': 1, 'revenue': '9.00'})
+        tomorrow = self.today + datetime.timedelta(days=1)
+        response = self.client.get(reverse('sales_report'), {'start': tomorrow.isoformat()})
+        self.assertEqual(response.data['totals'], {'orders': 0, 'revenue': '0.00'})
+        self.assertEqual(response.data['by_day'], [])
+        response = self.client.get(reverse('sales_report'), {'status': 'Lost'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_report_requires_staff(self):
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        response = self.client.get(reverse('sales_report'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,93 @@
+import base64
+import json
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from Lab4.models import Product, Customer, Order
+
+class AsyncReadViewTest(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.products = [
+            Product.objects.create(name=f'Product {index}', price=1.99, available=True)
+            for index in range(5)
+        ]
+        self.orders = []
+        for _ in range(3):
+            order = Order.objects.create(customer=self.customer, status='New')
+            order.products.add(*self.products[:2])
+            self.orders.append(order)
+        self.regular_user = User.objects.create_user(username='testuser', password='testpassword')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.regular_user)}'}
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('async-product-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+    async def test_session_cookie_is_not_authentication(self):
+        await self.async_client.aforce_login(self.regular_user)
+        response = await self.async_client.get(reverse('async-product-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_product_list_matches_sync_endpoint(self):
+        async_response = await self.async_client.get(reverse('async-product-list'), headers=self.headers)
+        sync_response = await self.async_client.get(reverse('product-list'), headers=self.headers)
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.json()['results'], sync_response.json()['results'])
+
+    async def test_product_list_keyset_pagination(self):
+        ids = []
+        url = reverse('async-product-list') + '?page_size=2'
+        while url:
+            response = await self.async_client.get(url, headers=self.headers)
+            data = response.json()
+            ids.extend(product['id'] for product in data['results'])
+            url = data['next']
+        self.assertEqual(ids, [product.id for product in self.products])
+
+    async def test_order_list_pages_on_date_and_id(self):
+        ids = []
+        url = reverse('async-order-list') + '?page_size=1&expand=customer'
+        while url:
+            response = await self.async_client.get(url, headers=self.headers)
+            data = response.json()
+            self.assertTrue(all(order['customer']['name'] == 'John Doe' for order in data['results']))
+            ids.extend(order['id'] for order in data['results'])
+            url = data['next']
+        self.assertEqual(ids, [order.id for order in reversed(self.orders)])
+
+    async def test_order_retrieve_with_expanded_products(self):
+        url = reverse('async-order-detail', kwargs={'pk': self.orders[0].id})
+        response = await self.async_client.get(url + '?expand=products', headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['name'] for product in response.json()['products']], ['Product 0', 'Product 1'])
+
+    async def test_unknown_expand_field(self):
+        response = await self.async_client.get(reverse('async-order-list') + '?expand=invoice', headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_retrieve_nonexistent_customer(self):
+        url = reverse('async-customer-detail', kwargs={'pk': 999})
+        response = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_writes_are_not_allowed(self):
+        response = await self.async_client.post(reverse('async-product-list'), {}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_invalid_cursor(self):
+        cursors = [
+            ('async-order-list', ['not-a-date', 1]),
+            ('async-order-list', [None, 1]),
+            ('async-product-list', ['x']),
+            ('async-product-list', [{'id': 1}]),
+            ('async-product-list', [1, 2]),
+        ]
+        for name, values in cursors:
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            response = await self.async_client.get(reverse(name), {'cursor': cursor}, headers=self.headers)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, values)
+            self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
@@ -0,0 +1,277 @@
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from Lab4.models import Product, Customer, Order
+from Lab4.management.commands.import_data import Checkpoint
+
+class PopulateSampleDataCommandTest(TestCase):
+    def populate(self, **options):
+        call_command('populate_sample_data', stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return (
+            list(Product.objects.order_by('id').values_list('id', 'name', 'price', 'available')),
+            list(Customer.objects.order_by('id').values_list('id', 'name', 'address')),
+            list(Order.objects.order_by('id').values_list('id', 'customer_id', 'status')),
+            list(Order.products.through.objects.order_by('order_id', 'product_id').values_list('order_id', 'product_id')),
+        )
+
+    def test_default_dataset(self):
+        self.populate()
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Customer.objects.count(), 3)
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_generates_requested_sizes_in_batches(self):
+        self.populate(products=50, customers=20, orders=120, lines_per_order=3, batch_size=25)
+        self.assertEqual(Product.objects.count(), 50)
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(Order.objects.count(), 120)
+        self.assertEqual(Order.products.through.objects.count(), 360)
+        self.assertTrue(all(product.price > 0 for product in Product.objects.all()))
+
+    def test_generation_is_deterministic(self):
+        self.populate(products=30, customers=10, orders=40, seed=7, batch_size=7)
+        first = self.snapshot()
+        self.populate(products=30, customers=10, orders=40, seed=7, batch_size=100)
+        self.assertEqual(self.snapshot(), first)
+        self.populate(products=30, customers=10, orders=40, seed=8)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_keeps_generated_order_dates(self):
+        self.populate(products=5, customers=5, orders=20)
+        dates = list(Order.objects.values_list('date', flat=True))
+        # Spread over the past year rather than all set to the current time.
+        self.assertEqual(len(set(dates)), 20)
+        self.assertLess(min(dates), Order.objects.create(customer_id=1, status='New').date - datetime.timedelta(days=1))
+        self.assertTrue(Order._meta.get_field('date').auto_now_add)
+
+    def test_new_rows_do_not_collide_with_generated_ids(self):
+        self.populate(products=5, customers=5, orders=5)
+        product = Product.objects.create(name='New product', price=1.99, available=True)
+        self.assertEqual(product.id, 6)
+
+    def test_copy_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            self.populate(copy=True)
+
+class BenchmarkEndpointsCommandTest(TestCase):
+    def setUp(self):
+        call_command('populate_sample_data', products=5, customers=3, orders=4, stdout=StringIO())
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, 'results.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def benchmark(self, **options):
+        stdout = StringIO()
+        call_command('benchmark_endpoints', iterations=3, warmup=1, host='testserver', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_reports_every_endpoint(self):
+        self.benchmark(output=self.output, cold=True)
+        with open(self.output) as output:
+            report = json.load(output)
+        self.assertEqual(report['dataset'], {'products': 5, 'customers': 3, 'orders': 4})
+        self.assertIn('html-product-list', report['results'])
+        for name, result in report['results'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries'], 0, name)
+
+    def test_runs_without_rate_limits(self):
+        rates = {'anon': '1/min', 'user': '1/min', 'product.list': '1/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            self.benchmark(output=self.output, only=['products-list', 'products-retrieve'])
+        with open(self.output) as output:
+            results = json.load(output)['results']
+        self.assertEqual([result['errors'] for result in results.values()], [0, 0])
+
+    def test_create_scenarios_are_rolled_back(self):
+        self.benchmark(only=['products-create', 'orders-create'])
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(Order.objects.count(), 4)
+
+    def test_flags_regressions_against_baseline(self):
+        self.benchmark(output=self.output, only=['products-list'])
+        with open(self.output) as output:
+            report = json.load(output)
+        report['results']['products-list']['p95_ms'] = 0.0001
+        with open(self.output, 'w') as output:
+            json.dump(report, output)
+        self.assertIn('REGRESSION products-list', self.benchmark(baseline=self.output, only=['products-list']))
+        with self.assertRaises(CommandError):
+            self.benchmark(baseline=self.output, only=['products-list'], fail_on_regression=True)
+
+
+class BenchmarkConcurrencyCommandTest(TransactionTestCase):
+    # Worker threads use their own connections, so the data must be committed.
+    def setUp(self):
+        call_command('populate_sample_data', products=5, customers=3, orders=4, stdout=StringIO())
+
+    def test_compares_sync_and_async_paths(self):
+        for resource in ('products', 'orders'):
+            stdout = StringIO()
+            call_command('benchmark_concurrency', resource=resource, requests=6, concurrency=3, sync_workers=2,
+                         query_latency_ms=1, host='testserver', stdout=stdout)
+            output = stdout.getvalue()
+            self.assertRegex(output, r'sync .* 0 errors')
+            self.assertRegex(output, r'async .* 0 errors')
+            self.assertIn('async/sync throughput', output)
+
+
+class ImportDataCommandTest(TestCase):
+    def setUp(self):
+        call_command('populate_sample_data', products=6, customers=3, orders=5, stdout=StringIO())
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write_lines(self, name, lines):
+        with open(self.path(name), 'w') as output:
+            output.write('\n'.join(lines) + '\n')
+        return self.path(name)
+
+    def import_data(self, *args, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_data', *args, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_round_trips_export_data(self):
+        exported = {}
+        for resource, export_format in (('products', 'ndjson'), ('customers', 'csv'), ('orders', 'csv')):
+            exported[resource] = self.path(f'{resource}.{export_format}')
+            call_command('export_data', resource, format=export_format, output=exported[resource])
+        snapshot = list(Order.objects.order_by('id').values_list('id', 'customer_id', 'date', 'status'))
+        lines = list(Order.products.through.objects.order_by('order_id', 'product_id').values_list('order_id', 'product_id'))
+        call_command('populate_sample_data', products=0, customers=0, orders=0, stdout=StringIO())
+
+        for resource in ('products', 'customers', 'orders'):
+            stdout, stderr = self.import_data(resource, exported[resource], batch_size=2)
+            self.assertIn('(0 rejected)', stdout)
+            self.assertEqual(stderr, '')
+        self.assertEqual(Product.objects.count(), 6)
+        self.assertEqual(list(Order.objects.order_by('id').values_list('id', 'customer_id', 'date', 'status')), snapshot)
+        self.assertEqual(
+            list(Order.products.through.objects.order_by('order_id', 'product_id').values_list('order_id', 'product_id')),
+            lines
+        )
+        self.assertFalse(os.path.exists(f"{exported['orders']}.checkpoint"))
+        self.assertEqual(Product.objects.create(name='New', price='1.00').pk, 7)
+
+    def test_round_trips_blank_csv_cells(self):
+        Product.objects.filter(pk=1).update(stock=3)
+        path = self.path('products.csv')
+        call_command('export_data', 'products', format='csv', output=path)
+        snapshot = list(Product.objects.order_by('id').values_list('id', 'stock'))
+        Product.objects.update(stock=7)
+        stdout, stderr = self.import_data('products', path)
+        self.assertIn('(0 rejected)', stdout)
+        self.assertEqual(list(Product.objects.order_by('id').values_list('id', 'stock')), snapshot)
+        self.assertEqual(snapshot[:2], [(1, 3), (2, None)])
+
+    def test_availability_follows_imported_stock(self):
+        path = self.write_lines('products.ndjson', [
+            '{"id": 1, "name": "Sold out", "price": "1.00", "stock": 0, "available": true}',
+            '{"id": 2, "name": "In stock", "price": "1.00", "stock": 4, "available": false}',
+            '{"id": 3, "name": "Untracked", "price": "1.00", "stock": null, "available": false}',
+        ])
+        self.import_data('products', path)
+        self.assertEqual(
+            list(Product.objects.filter(pk__lte=3).order_by('id').values_list('stock', 'available')),
+            [(0, False), (4, True), (None, False)]
+        )
+
+    def test_updates_existing_rows_and_replaces_order_lines(self):
+        path = self.write_lines('orders.ndjson', [
+            '{"id": 1, "customer": 3, "status": "New", "products": [5]}',
+            '{"id": 1, "customer": 2, "status": "Sent", "date": "2024-05-01T10:00:00Z", "products": [3, 4]}',
+        ])
+        self.import_data('orders', path)
+        order = Order.objects.get(pk=1)
+        self.assertEqual((order.customer_id, order.status, order.date.year), (2, 'Sent', 2024))
+        self.assertEqual(sorted(order.products.values_list('pk', flat=True)), [3, 4])
+        self.assertEqual(Order.objects.count(), 5)
+
+    def test_rejects_invalid_rows_and_imports_the_rest(self):
+        path = self.write_lines('products.csv', [
+            'id,name,price,available',
+            '10,Good,5.00,True',
+            '11,Free,0.00,True',
+            '12,Broken,abc,True',
+            ',Anonymous,1.00,True',
+        ])
+        stdout, stderr = self.import_data('products', path)
+        self.assertIn('Imported 1 products (3 rejected)', stdout)
+        self.assertIn('Row 2: Price must be positive', stderr)
+        self.assertIn('Row 3:', stderr)
+        self.assertIn('Row 4: This field is required.', stderr)
+        self.assertEqual(list(Product.objects.filter(pk__gte=10).values_list('name', flat=True)), ['Good'])
+
+    def test_rejects_orders_with_unknown_relations(self):
+        path = self.write_lines('orders.ndjson', [
+            '{"id": 20, "customer": 99, "status": "New", "products": [1]}',
+            '{"id": 21, "customer": 1, "status": "New", "products": [1, 98]}',
+            '{"id": 22, "customer": 1, "status": "Lost", "products": []}',
+            '{"id": 23, "customer": 1, "status": "New", "products": [1, 2]}',
+        ])
+        with CaptureQueriesContext(connection) as captured:
+            stdout, stderr = self.import_data('orders', path)
+        for model in (Customer, Product):
+            lookups = [query for query in captured.captured_queries
+                       if query['sql'].startswith(f'SELECT "{model._meta.db_table}"."id" FROM')]
+            self.assertEqual(len(lookups), 1)
+        self.assertIn('Imported 1 orders (3 rejected)', stdout)
+        self.assertIn('Row 1: customer 99 does not exist', stderr)
+        self.assertIn('Row 2: product 98 does not exist', stderr)
+        self.assertIn("Row 3: Value 'Lost' is not a valid choice.", stderr)
+        self.assertEqual(list(Order.objects.filter(pk__gte=20).values_list('pk', flat=True)), [23])
+
+    def test_resumes_after_committed_rows(self):
+        path = self.write_lines('customers.ndjson', [
+            f'{{"id": {pk}, "name": "Imported {pk}", "address": "1 Import St"}}' for pk in range(10, 15)
+        ])
+        Checkpoint(f'{path}.checkpoint', 'customers', path).save(3)
+        stdout, _ = self.import_data('customers', path, resume=True)
+        self.assertIn('Resuming after 3 committed rows.', stdout)
+        self.assertEqual(list(Customer.objects.filter(pk__gte=10).values_list('pk', flat=True)), [13, 14])
+
+        Checkpoint(f'{path}.checkpoint', 'orders', path).save(3)
+        with self.assertRaises(CommandError):
+            self.import_data('customers', path, resume=True)
+        self.import_data('customers', path)
+        self.assertEqual(Customer.objects.filter(pk__gte=10).count(), 5)
+
+    def test_copy_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            self.import_data('products', self.write_lines('products.ndjson', []), copy=True)
+
+
+class BenchmarkConnectionsCommandTest(TestCase):
+    def setUp(self):
+        call_command('populate_sample_data', products=3, customers=1, orders=1, stdout=StringIO())
+
+    def test_reports_each_mode(self):
+        stdout = StringIO()
+        call_command('benchmark_connections', requests=3, host='testserver', stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ['per-request', 'persistent'])
+        for line in lines:
+            self.assertRegex(line, r'connect +[\d.]+ms .* connections/request$')
+
+    def test_pool_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_connections', modes=['pool'], stdout=StringIO())
@@ -0,0 +1,168 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from Lab4.aggregates import rebuild_sales_aggregates
+from Lab4.jobs import claim_jobs, enqueue, job_handler, requeue_abandoned, retry_delay, run_job
+from Lab4.models import Customer, DailySales, Job, Order, Product
+
+calls = []
+
+
+@job_handler('test.flaky')
+def flaky(payload, using):
+    calls.append(payload)
+    if len(calls) <= payload.get('failures', 0):
+        raise RuntimeError('Temporary failure')
+
+
+def create_order(status='New'):
+    customer = Customer.objects.create(name='Customer', address='123 Main St')
+    order = Order.objects.create(customer=customer, status=status)
+    order.products.add(Product.objects.create(name='Product', price=Decimal('5.00')))
+    return order
+
+
+@override_settings(JOB_RETRY_DELAY=10, JOB_RETRY_MAX_DELAY=25, JOB_MAX_ATTEMPTS=3)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def claim_and_run(self):
+        ids = claim_jobs(10, 'default')
+        return [run_job(pk) for pk in ids]
+
+    def test_claims_each_ready_job_once(self):
+        first = enqueue('test.flaky', {})
+        later = enqueue('test.flaky', {})
+        Job.objects.filter(pk=later.pk).update(run_at=timezone.now() + datetime.timedelta(minutes=1))
+        self.assertEqual(claim_jobs(10, 'default'), [first.pk])
+        self.assertEqual(claim_jobs(10, 'default'), [])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (Job.RUNNING, 1))
+
+    def test_retries_with_backoff_then_fails(self):
+        self.assertEqual([retry_delay(attempts) for attempts in (1, 2, 3)], [10, 20, 25])
+        job = enqueue('test.flaky', {'failures': 5})
+        outcomes = []
+        for _ in range(3):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            before = timezone.now()
+            outcomes += self.claim_and_run()
+            job.refresh_from_db()
+            if job.status == Job.QUEUED:
+                self.assertGreaterEqual(job.run_at, before + datetime.timedelta(seconds=retry_delay(job.attempts)))
+        self.assertEqual(outcomes, ['retry', 'retry', 'failed'])
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertIn('Temporary failure', job.last_error)
+
+    def test_succeeds_on_retry(self):
+        job = enqueue('test.flaky', {'failures': 1})
+        self.assertEqual(self.claim_and_run(), ['retry'])
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(self.claim_and_run(), ['done'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.DONE, 2, ''))
+
+    def test_requeues_abandoned_jobs(self):
+        job = enqueue('test.flaky', {})
+        claim_jobs(1, 'default')
+        self.assertEqual(requeue_abandoned('default'), 0)
+        Job.objects.filter(pk=job.pk).update(claimed_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(requeue_abandoned('default'), 1)
+        self.assertEqual(self.claim_and_run(), ['done'])
+
+    def test_order_transition(self):
+        order = create_order()
+        rebuild_sales_aggregates('default')
+        job = enqueue('order.transition', {'order': order.pk, 'status': 'In Process'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.claim_and_run(), ['done'])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'In Process')
+        rows = {(row.status, row.orders) for row in DailySales.objects.exclude(orders=0)}
+        self.assertEqual(rows, {('In Process', 1)})
+
+        # Running it again changes nothing; skipping a status is refused.
+        Job.objects.filter(pk=job.pk).update(status=Job.QUEUED)
+        self.assertEqual(self.claim_and_run(), ['done'])
+        enqueue('order.transition', {'order': order.pk, 'status': 'Completed'})
+        self.assertEqual(self.claim_and_run(), ['failed'])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'In Process')
+
+
+class ProcessJobsCommandTest(TransactionTestCase):
+    # Worker threads use their own connections, so the jobs must be committed.
+    def setUp(self):
+        calls.clear()
+
+    def test_runs_ready_jobs_on_thread_pool(self):
+        jobs = [enqueue('test.flaky', {'job': index}) for index in range(6)]
+        Job.objects.create(kind='test.unknown')
+        stdout = StringIO()
+        call_command('process_jobs', workers=2, once=True, poll_interval=0.01, stdout=stdout)
+        self.assertIn('Processed 7 jobs (6 done, 1 failed).', stdout.getvalue())
+        self.assertEqual(sorted(payload['job'] for payload in calls), list(range(len(jobs))))
+        self.assertFalse(Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING]).exists())
+
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_runs_ready_jobs_on_process_pool(self):
+        # Handlers registered here do not exist in the worker processes.
+        orders = [create_order() for _ in range(4)]
+        for order in orders:
+            enqueue('order.transition', {'order': order.pk, 'status': 'In Process'})
+        Job.objects.create(kind='test.flaky')
+        stdout = StringIO()
+        call_command('process_jobs', workers=2, pool='process', once=True, poll_interval=0.01, stdout=stdout)
+        self.assertIn('Processed 5 jobs (4 done, 1 failed).', stdout.getvalue())
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'In Process'})
+        # The parent's connection still works after the workers used theirs.
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 4)
+
+
+class OrderTransitionApiTest(TestCase):
+    def setUp(self):
+        self.order = create_order()
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        self.url = reverse('order-transition', args=[self.order.pk])
+
+    def test_enqueues_and_returns_accepted(self):
+        with mock.patch('Lab4.jobs.transition_order') as handler:
+            response = self.client.post(self.url, {'status': 'In Process'}, format='json')
+        handler.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.payload), ('order.transition', {'order': self.order.pk, 'status': 'In Process'}))
+        self.assertEqual(response['Location'], reverse('job-detail', args=[job.pk]))
+        self.assertEqual(self.client.get(response['Location']).data['status'], Job.QUEUED)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'New')
+
+    def test_rejects_invalid_transition(self):
+        response = self.client.post(self.url, {'status': 'Sent'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', response.data)
+        self.assertFalse(Job.objects.exists())
+
+    def test_regular_user_cannot_transition(self):
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        self.assertEqual(self.client.post(self.url, {'status': 'In Process'}, format='json').status_code, 403)
+        self.assertEqual(self.client.get(reverse('job-list')).status_code, 403)
+
+    def test_metrics_report_queue_depth(self):
+        enqueue('order.transition', {'order': self.order.pk, 'status': 'In Process'})
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('lab4_jobs{status="queued"} 1', body)
+        self.assertIn('lab4_job_queue_depth 1', body)
+        self.assertRegex(body, r'lab4_job_queue_wait_seconds [\d.]+')
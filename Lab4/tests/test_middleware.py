@@ -0,0 +1,58 @@
+import re
+import time
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from Lab4.models import Product
+from Lab4.serializers import ProductSerializer
+
+@override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+class RequestTimingMiddlewareTest(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Temporary product', price=1.99, available=True)
+        self.regular_user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.regular_user)}')
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('product-detail', kwargs={'pk': self.product.id}), {'t': 'header'})
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        for metric in ('app', 'serialize', 'render', 'total'):
+            self.assertRegex(timing, rf'{metric};dur=[\d.]+')
+        queries = int(re.search(r'desc="(\d+) queries"', timing).group(1))
+        self.assertGreaterEqual(queries, 1)
+
+    def test_serializer_time_is_reported_apart(self):
+        def slow(serializer, instance):
+            time.sleep(0.05)
+            return representation(serializer, instance)
+
+        representation = ProductSerializer.to_representation
+        with mock.patch.object(ProductSerializer, 'to_representation', slow):
+            response = self.client.get(reverse('product-detail', kwargs={'pk': self.product.id}), {'t': 'serialize'})
+        durations = dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+        self.assertGreaterEqual(float(durations['serialize']), 50)
+        self.assertLess(float(durations['app']), 50)
+
+    def test_metrics_endpoint_exposes_histograms(self):
+        self.client.get(reverse('product-list'), {'t': 'metrics'})
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('# TYPE lab4_request_duration_seconds histogram', body)
+        self.assertRegex(body, r'lab4_request_duration_seconds_count\{view="product-list",method="GET"\} [1-9]')
+        self.assertRegex(body, r'lab4_request_serialize_duration_seconds_count\{view="product-list"\} [1-9]')
+        self.assertRegex(body, r'lab4_request_queries_bucket\{view="product-list",le="\+Inf"\} [1-9]')
+        self.assertIn('lab4_response_cache_lookups_total{result="miss"}', body)
+        self.assertRegex(body, r'lab4_db_connections_opened_total\{alias="default"\} [1-9]')
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_disabled_when_sample_rate_is_zero(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.regular_user)}')
+        response = client.get(reverse('product-list'))
+        self.assertNotIn('Server-Timing', response)
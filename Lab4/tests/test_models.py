@@ -186,4 +186,37 @@ class OrderModelTest(TestCase):
         )
         order.products.add(self.product1, self.product2)
         self.assertFalse(order.can_be_fulfilled())
-    
\ No newline at end of file
+
+    def test_with_totals_annotates_total_price_and_fulfillable(self):
+        order = Order.objects.create(
+            customer=self.customer,
+            status='New'
+        )
+        order.products.add(self.product1, self.product2)
+        annotated = Order.objects.with_totals().get(pk=order.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(float(annotated.total_price()), 49.98)
+            self.assertFalse(annotated.can_be_fulfilled())
+
+    def test_with_totals_for_order_without_products(self):
+        order = Order.objects.create(
+            customer=self.customer,
+            status='New'
+        )
+        annotated = Order.objects.with_totals().get(pk=order.pk)
+        self.assertEqual(annotated.total_price(), 0)
+        self.assertTrue(annotated.can_be_fulfilled())
+
+    def test_with_totals_uses_constant_number_of_queries(self):
+        for _ in range(20):
+            order = Order.objects.create(
+                customer=self.customer,
+                status='New'
+            )
+            order.products.add(self.product1)
+        with self.assertNumQueries(1):
+            orders = list(Order.objects.with_totals())
+            self.assertEqual(len(orders), 20)
+            for order in orders:
+                self.assertEqual(float(order.total_price()), 19.99)
+                self.assertTrue(order.can_be_fulfilled())
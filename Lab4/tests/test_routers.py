@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, router
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from Lab4.models import Product
+from Lab4.routers import ReplicaRouter, replica_reads
+
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_PIN_SECONDS=60)
+class ReplicaRoutingTest(TestCase):
+    """
+    Runs against a second SQLite database standing in for a replica. It is
+    seeded separately, so each response shows which database served it.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Not in DATABASES, so the test runner would not create it; it is
+        # allowed only once the class has set up the test databases.
+        cls.databases = {*cls.databases, REPLICA}
+        cls.directory = tempfile.mkdtemp()
+        connections.settings[REPLICA] = connections.configure_settings({
+            'default': connections.settings['default'],
+            REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.directory, 'replica.sqlite3')},
+        })[REPLICA]
+        with override_settings(DATABASE_REPLICAS=[]):
+            call_command('migrate', database=REPLICA, verbosity=0)
+        Product.objects.using(REPLICA).create(name='Replica copy', price=Decimal('1.00'))
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        shutil.rmtree(cls.directory)
+        cls.databases = cls.databases - {REPLICA}
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(name='Primary copy', price=Decimal('2.00'))
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client = self.client_for(self.admin)
+
+    def client_for(self, user):
+        # Replicated, as any user that is not brand new would be.
+        user.save(using=REPLICA)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def product_names(self, client):
+        response = client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']], response['X-Cache']
+
+    def test_api_reads_use_replica(self):
+        self.assertEqual(self.product_names(self.client), (['Replica copy'], 'MISS'))
+        self.assertEqual(self.product_names(self.client), (['Replica copy'], 'HIT'))
+        response = self.client.get(reverse('product-export', args=['ndjson']))
+        self.assertIn(b'Replica copy', b''.join(response.streaming_content))
+
+    def test_writer_is_pinned_to_primary(self):
+        response = self.client.post(reverse('product-list'), {'name': 'New', 'price': '3.00'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        other = self.client_for(User.objects.create_user(username='reader', password='testpassword'))
+        self.assertEqual(self.product_names(other), (['Replica copy'], 'MISS'))
+        # Not cached while the replica may lag behind the write.
+        self.assertEqual(self.product_names(other), (['Replica copy'], 'MISS'))
+
+        names, _ = self.product_names(self.client)
+        self.assertEqual(sorted(names), ['New', 'Primary copy'])
+
+    def test_admin_reads_primary(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:Lab4_product_changelist'))
+        self.assertContains(response, 'Primary copy')
+        self.assertNotContains(response, 'Replica copy')
+
+    def test_router(self):
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Product), REPLICA)
+            self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertIs(ReplicaRouter().allow_migrate(REPLICA, 'Lab4'), False)
+        self.assertIsNone(ReplicaRouter().allow_migrate('default', 'Lab4'))
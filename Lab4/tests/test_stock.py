@@ -0,0 +1,180 @@
+import threading
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from Lab4.models import Customer, Order, OutOfStock, Product
+
+
+def admin_client(admin=None):
+    admin = admin or User.objects.create_superuser(username='testadmin', password='testpassword')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(admin)}')
+    return client
+
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = admin_client()
+        self.customer = Customer.objects.create(name='Customer', address='123 Main St')
+        self.scarce = Product.objects.create(name='Scarce', price=Decimal('5.00'), stock=2)
+        self.plenty = Product.objects.create(name='Plenty', price=Decimal('1.00'), stock=100)
+        self.untracked = Product.objects.create(name='Untracked', price=Decimal('1.00'))
+
+    def order(self, *products):
+        data = {'customer': self.customer.pk, 'status': 'New', 'products': [product.pk for product in products]}
+        return self.client.post(reverse('order-list'), data, format='json')
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock, product.available
+
+    def test_order_reserves_stock(self):
+        detail = reverse('product-detail', args=[self.scarce.pk])
+        self.assertEqual(self.client.get(detail).data['stock'], 2)
+
+        self.assertEqual(self.order(self.scarce, self.untracked).status_code, 201)
+        self.assertEqual(self.stock(self.scarce), (1, True))
+        self.assertEqual(self.stock(self.untracked), (None, True))
+        self.assertEqual(self.client.get(detail).data['stock'], 1)
+
+        self.assertEqual(self.order(self.scarce).status_code, 201)
+        self.assertEqual(self.stock(self.scarce), (0, False))
+
+        response = self.order(self.plenty, self.scarce)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['products'], [f'Product {self.scarce.pk} is out of stock.'])
+        # Nothing is kept from the refused order.
+        self.assertEqual(self.stock(self.plenty), (100, True))
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_bulk_orders_reserve_together(self):
+        url = reverse('order-bulk')
+        orders = [
+            {'customer': self.customer.pk, 'status': 'New', 'products': [self.scarce.pk, self.plenty.pk]}
+            for _ in range(3)
+        ]
+        response = self.client.post(url, orders, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(self.plenty), (100, True))
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post(url, orders[:2], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(self.scarce), (0, False))
+        self.assertEqual(self.stock(self.plenty), (98, True))
+
+    def test_repeated_products_are_reserved_once(self):
+        self.assertEqual(self.order(self.scarce, self.scarce).status_code, 201)
+        self.assertEqual(self.stock(self.scarce), (1, True))
+        self.assertEqual(list(Order.objects.get().products.all()), [self.scarce])
+
+        orders = [{'customer': self.customer.pk, 'status': 'New', 'products': [self.plenty.pk] * 3}] * 2
+        self.assertEqual(self.client.post(reverse('order-bulk'), orders, format='json').status_code, 201)
+        self.assertEqual(self.stock(self.plenty), (98, True))
+
+    def test_updates_reserve_added_products(self):
+        self.assertEqual(self.order(self.plenty).status_code, 201)
+        order = Order.objects.get()
+        url = reverse('order-detail', args=[order.pk])
+        response = self.client.patch(url, {'products': [self.plenty.pk, self.scarce.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # Products the order already held are not reserved again.
+        self.assertEqual(self.stock(self.plenty), (99, True))
+        self.assertEqual(self.stock(self.scarce), (1, True))
+
+        other = Order.objects.create(customer=self.customer, status='New')
+        response = self.client.patch(reverse('order-bulk'), [
+            {'id': order.pk, 'products': [self.scarce.pk]},
+            {'id': other.pk, 'products': [self.scarce.pk, self.plenty.pk]},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(self.scarce), (0, False))
+        self.assertEqual(self.stock(self.plenty), (98, True))
+
+        third = Order.objects.create(customer=self.customer, status='New')
+        data = {'customer': self.customer.pk, 'status': 'New', 'products': [self.plenty.pk, self.scarce.pk]}
+        response = self.client.put(reverse('order-detail', args=[third.pk]), data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['products'], [f'Product {self.scarce.pk} is out of stock.'])
+        self.assertEqual(self.stock(self.plenty), (98, True))
+        self.assertFalse(third.products.exists())
+
+    def test_products_are_updated_in_id_order(self):
+        with CaptureQueriesContext(connection) as captured:
+            Product.objects.reserve({self.plenty.pk: 1, self.untracked.pk: 1, self.scarce.pk: 1})
+        updates = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertIn(f'"id" = {self.scarce.pk}', updates[0])
+        self.assertIn(f'"id" = {self.plenty.pk}', updates[1])
+        with self.assertRaises(OutOfStock):
+            Product.objects.reserve({self.scarce.pk: 2})
+
+    def test_reservations_stop_when_stock_runs_out(self):
+        # What the concurrent test checks, one transaction after another.
+        outcomes = []
+        for _ in range(4):
+            try:
+                with transaction.atomic():
+                    Product.objects.reserve({self.plenty.pk: 1, self.scarce.pk: 1})
+                outcomes.append('reserved')
+            except OutOfStock as exc:
+                outcomes.append(exc.product_id)
+        self.assertEqual(outcomes, ['reserved', 'reserved', self.scarce.pk, self.scarce.pk])
+        self.assertEqual(self.stock(self.scarce), (0, False))
+        self.assertEqual(self.stock(self.plenty), (98, True))
+
+    def test_available_follows_stock(self):
+        url = reverse('product-detail', args=[self.plenty.pk])
+        response = self.client.patch(url, {'stock': 0, 'available': True}, format='json')
+        self.assertEqual((response.data['stock'], response.data['available']), (0, False))
+
+        response = self.client.patch(reverse('product-bulk'), [{'id': self.plenty.pk, 'stock': 3}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(self.plenty), (3, True))
+
+        self.plenty.stock = 0
+        self.plenty.save(update_fields=['stock'])
+        self.assertEqual(self.stock(self.plenty), (0, False))
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConcurrentStockReservationTest(TransactionTestCase):
+    """Many clients ordering the last units at once, each on its own connection."""
+
+    def test_concurrent_orders_do_not_oversell(self):
+        admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        customer = Customer.objects.create(name='Customer', address='123 Main St')
+        products = [
+            Product.objects.create(name=f'Product {index}', price=Decimal('1.00'), stock=5) for index in range(3)
+        ]
+        barrier = threading.Barrier(12)
+        statuses = []
+
+        def order(index):
+            # Half the orders list the products in reverse, which would
+            # deadlock if rows were locked in payload order.
+            ids = [product.pk for product in products]
+            data = {'customer': customer.pk, 'status': 'New', 'products': ids[::-1] if index % 2 else ids}
+            try:
+                client = admin_client(admin)
+                barrier.wait()
+                statuses.append(client.post(reverse('order-list'), data, format='json').status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=order, args=[index]) for index in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [201] * 5 + [400] * 7)
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertEqual(list(Product.objects.values_list('stock', 'available')), [(0, False)] * 3)
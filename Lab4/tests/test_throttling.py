@@ -0,0 +1,91 @@
+from decimal import Decimal
+from asgiref.sync import async_to_sync
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from Lab4.models import Product
+from Lab4.throttling import TokenBucketThrottle
+
+RATES = {'anon': '2/min', 'user': '10/min', 'product.list': '3/min'}
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': RATES})
+class TokenBucketThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        timer = mock.patch.object(TokenBucketThrottle, 'timer', lambda throttle: self.now)
+        timer.start()
+        self.addCleanup(timer.stop)
+        self.product = Product.objects.create(name='Product', price=Decimal('1.00'))
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = self.client_for(self.user)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        return client
+
+    def list_products(self, client=None):
+        return (client or self.client).get(reverse('product-list'), {'search': 'Product'})
+
+    def test_endpoint_bucket_empties_and_refills(self):
+        remaining = [self.list_products()['X-RateLimit-Remaining'] for _ in range(3)]
+        self.assertEqual(remaining, ['2', '1', '0'])
+        response = self.list_products()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(response['X-RateLimit-Limit'], '3')
+        self.assertEqual(response['X-RateLimit-Reset'], '60')
+
+        # One token comes back every 20 seconds; refused requests take none.
+        self.now += 19
+        self.assertEqual(self.list_products().status_code, 429)
+        self.now += 1
+        self.assertEqual(self.list_products().status_code, 200)
+        self.assertEqual(self.list_products().status_code, 429)
+        self.now += 3600
+        self.assertEqual(self.list_products()['X-RateLimit-Remaining'], '2')
+
+    def test_buckets_are_per_user_and_endpoint(self):
+        for _ in range(3):
+            self.list_products()
+        self.assertEqual(self.list_products().status_code, 429)
+
+        detail = self.client.get(reverse('product-detail', args=[self.product.pk]))
+        self.assertEqual(detail.status_code, 200)
+        # The user's own bucket has 10 - 4 - 1 tokens left.
+        self.assertEqual(detail['X-RateLimit-Remaining'], '5')
+        self.assertEqual(detail['X-RateLimit-Limit'], '10')
+
+        other = self.client_for(User.objects.create_user(username='other', password='testpassword'))
+        self.assertEqual(self.list_products(other).status_code, 200)
+
+    def test_anonymous_clients_are_limited_by_address(self):
+        url = reverse('token_obtain_pair')
+        data = {'username': 'testuser', 'password': 'wrong'}
+        statuses = [APIClient().post(url, data, format='json').status_code for _ in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+        other = APIClient(REMOTE_ADDR='10.0.0.2').post(url, data, format='json')
+        self.assertEqual(other.status_code, 401)
+
+    def test_async_endpoints_share_the_buckets(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        get = async_to_sync(self.async_client.get)
+        self.list_products()
+        response = get(reverse('async-product-list'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-RateLimit-Remaining'], '1')
+        self.list_products()
+        response = get(reverse('async-product-list'), headers=headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        # Detail reads only draw on the user's bucket: 10 - 4 - 1.
+        response = get(reverse('async-product-detail', args=[self.product.pk]), headers=headers)
+        self.assertEqual((response.status_code, response['X-RateLimit-Remaining']), (200, '5'))
+        self.assertEqual(get(reverse('async-product-list')).status_code, 401)
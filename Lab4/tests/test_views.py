@@ -2,7 +2,17 @@ from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
 from Lab4.models import Product, Customer, Order
+from Lab4.views import ProductViewSet, CustomerViewSet, OrderViewSet
+from Lab4.pagination import IdCursorPagination
+from Lab4.search import get_search_backend
 from django.contrib.auth.models import User
+import datetime
+import json
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
+from django.db import connection
 from rest_framework_simplejwt.tokens import AccessToken
 
 class ProductApiTest(APITestCase):
@@ -23,20 +33,20 @@ class ProductApiTest(APITestCase):
     self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
     response = self.client.get(self.product_list_url)
     self.assertEqual(response.status_code, status.HTTP_200_OK)
-    self.assertEqual(len(response.data), 1)
-    self.assertEqual(response.data[0]['name'], 'Temporary product')
-    self.assertEqual(response.data[0]['price'], '1.99')
-    self.assertTrue(response.data[0]['available'])
+    self.assertEqual(len(response.data['results']), 1)
+    self.assertEqual(response.data['results'][0]['name'], 'Temporary product')
+    self.assertEqual(response.data['results'][0]['price'], '1.99')
+    self.assertTrue(response.data['results'][0]['available'])
 
   def test_get_all_products_as_admin(self):
     self.token = str(AccessToken.for_user(self.admin))
     self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
     response = self.client.get(self.product_list_url)
     self.assertEqual(response.status_code, status.HTTP_200_OK)
-    self.assertEqual(len(response.data), 1)
-    self.assertEqual(response.data[0]['name'], 'Temporary product')
-    self.assertEqual(response.data[0]['price'], '1.99')
-    self.assertTrue(response.data[0]['available'])
+    self.assertEqual(len(response.data['results']), 1)
+    self.assertEqual(response.data['results'][0]['name'], 'Temporary product')
+    self.assertEqual(response.data['results'][0]['price'], '1.99')
+    self.assertTrue(response.data['results'][0]['available'])
 
   def test_get_single_product_as_regular_user(self):
     self.token = str(AccessToken.for_user(self.regular_user))
@@ -139,3 +149,762 @@ class ProductApiTest(APITestCase):
     response = self.client.delete(nonexistent_product_url)
     self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+class OrderApiTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.product1 = Product.objects.create(name='Product 1', price=19.99, available=True)
+        self.product2 = Product.objects.create(name='Product 2', price=29.99, available=False)
+        self.order = Order.objects.create(customer=self.customer, status='New')
+        self.order.products.add(self.product1, self.product2)
+        self.order_list_url = reverse('order-list')
+        self.order_detail_url = reverse('order-detail', kwargs={'pk': self.order.id})
+        self.regular_user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.token = str(AccessToken.for_user(self.regular_user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_get_orders_returns_ids_by_default(self):
+        response = self.client.get(self.order_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['customer'], self.customer.id)
+        self.assertEqual(sorted(response.data['results'][0]['products']), [self.product1.id, self.product2.id])
+
+    def test_get_order_with_expanded_relations(self):
+        response = self.client.get(self.order_detail_url, {'expand': 'customer,products'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['customer']['name'], 'John Doe')
+        self.assertEqual(
+            sorted(product['name'] for product in response.data['products']),
+            ['Product 1', 'Product 2']
+        )
+
+    def test_get_orders_with_unknown_expand_field(self):
+        response = self.client.get(self.order_list_url, {'expand': 'invoice'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expanded_order_list_uses_constant_number_of_queries(self):
+        for _ in range(10):
+            order = Order.objects.create(customer=self.customer, status='New')
+            order.products.add(self.product1, self.product2)
+        # user lookup, orders joined with customers, prefetched products
+        with self.assertNumQueries(3):
+            response = self.client.get(self.order_list_url, {'expand': 'customer,products'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 11)
+
+class OrderFilterApiTest(APITestCase):
+    def setUp(self):
+        self.customers = [Customer.objects.create(name=f'Customer {index}', address='123 Main St') for index in range(2)]
+        self.now = datetime.datetime(2024, 5, 15, 12, tzinfo=datetime.timezone.utc)
+        self.orders = []
+        for index, order_status in enumerate(['New', 'In Process', 'In Process', 'Sent', 'New', 'In Process']):
+            order = Order.objects.create(customer=self.customers[index % 2], status=order_status)
+            order.date = self.now - datetime.timedelta(days=index * 3)
+            order.save()
+            self.orders.append(order)
+        self.client = APIClient()
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def ids(self, **params):
+        response = self.client.get(reverse('order-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [order['id'] for order in response.data['results']]
+
+    def order_ids(self, *indexes):
+        return [self.orders[index].pk for index in indexes]
+
+    def test_filters_by_status_customer_and_date_range(self):
+        self.assertEqual(self.ids(status='In Process'), self.order_ids(1, 2, 5))
+        self.assertEqual(self.ids(status=['New', 'Sent']), self.order_ids(0, 3, 4))
+        self.assertEqual(self.ids(customer=self.customers[1].pk), self.order_ids(1, 3, 5))
+        self.assertEqual(self.ids(date_after='2024-05-06', date_before='2024-05-12T12:00:00Z'), self.order_ids(2, 3))
+        self.assertEqual(
+            self.ids(status='In Process', customer=self.customers[0].pk, date_after='2024-05-01'),
+            self.order_ids(2)
+        )
+
+    def test_orders_by_date_in_either_direction(self):
+        self.assertEqual(self.ids(), self.order_ids(0, 1, 2, 3, 4, 5))
+        self.assertEqual(self.ids(ordering='date'), self.order_ids(5, 4, 3, 2, 1, 0))
+        self.assertEqual(self.ids(ordering='-date', page_size=2), self.order_ids(0, 1))
+
+    def test_rejects_invalid_filters(self):
+        for params in ({'status': 'Lost'}, {'customer': 'x'}, {'date_after': 'yesterday'}):
+            response = self.client.get(reverse('order-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def query_plan(self, **params):
+        with CaptureQueriesContext(connection) as captured:
+            self.ids(**params)
+        sql = next(query['sql'] for query in captured.captured_queries if query['sql'].startswith('SELECT "Lab4_order"'))
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # The test tables are tiny, so the planner would rather scan them.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_filtered_queries_use_indexes(self):
+        self.assertIn('lab4_order_status_date', self.query_plan(status='In Process', date_after='2024-05-01'))
+        self.assertIn('lab4_order_customer_date', self.query_plan(customer=self.customers[0].pk))
+        self.assertIn('lab4_order_date', self.query_plan(ordering='date'))
+
+class PaginationApiTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        for index in range(5):
+            Product.objects.create(name=f'Product {index}', price=1.99, available=True)
+            Order.objects.create(customer=self.customer, status='New')
+        self.regular_user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.token = str(AccessToken.for_user(self.regular_user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def collect_pages(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_products_are_paginated_by_id(self):
+        ids = self.collect_pages(reverse('product-list'), {'page_size': 2})
+        self.assertEqual(ids, list(Product.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_orders_are_paginated_newest_first(self):
+        ids = self.collect_pages(reverse('order-list'), {'page_size': 2})
+        self.assertEqual(ids, list(Order.objects.order_by('-date', '-id').values_list('id', flat=True)))
+
+    def test_pages_hold_up_to_1000_rows(self):
+        Product.objects.bulk_create(Product(name=f'Bulk {index}', price=1) for index in range(1000))
+        response = self.client.get(reverse('product-list'), {'page_size': 5000})
+        self.assertEqual(len(response.data['results']), 1000)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_count_is_only_returned_when_requested(self):
+        response = self.client.get(reverse('customer-list'))
+        self.assertNotIn('count', response.data)
+        response = self.client.get(reverse('product-list'), {'count': 'true', 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+
+class ProductSearchApiTest(APITestCase):
+    def setUp(self):
+        Product.objects.create(name='Apple juice', price=1.99, available=True)
+        Product.objects.create(name='Apple', price=0.99, available=True)
+        Product.objects.create(name='Orange juice', price=2.49, available=True)
+        self.product_list_url = reverse('product-list')
+        self.regular_user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.token = str(AccessToken.for_user(self.regular_user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def search(self, term, **params):
+        response = self.client.get(self.product_list_url, {'search': term, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['name'] for product in response.data['results']]
+
+    def test_search_matches_substrings_case_insensitively(self):
+        self.assertEqual(sorted(self.search('JUICE')), ['Apple juice', 'Orange juice'])
+        self.assertEqual(self.search('range'), ['Orange juice'])
+
+    def test_search_requires_all_terms(self):
+        self.assertEqual(self.search('apple juice'), ['Apple juice'])
+
+    def test_search_with_short_term(self):
+        self.assertEqual(sorted(self.search('ap')), ['Apple', 'Apple juice'])
+
+    def test_search_results_are_ranked(self):
+        self.assertEqual(self.search('apple')[0], 'Apple')
+
+    def test_search_results_can_be_paginated(self):
+        first = self.client.get(self.product_list_url, {'search': 'juice', 'page_size': 1}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual(
+            sorted(product['name'] for product in first['results'] + second['results']),
+            ['Apple juice', 'Orange juice']
+        )
+        self.assertIsNone(second['next'])
+
+    def test_search_pages_through_tied_ranks(self):
+        # Names of one length tie on rank, in a run longer than DRF's
+        # offset_cutoff.
+        count = IdCursorPagination.offset_cutoff + 100
+        Product.objects.bulk_create(Product(name=f'Product {index:04d}', price=1) for index in range(count))
+        get_search_backend().reindex('default')
+        ids = []
+        url = self.product_list_url + '?search=Product&page_size=400'
+        while url:
+            page = self.client.get(url).data
+            ids += [product['id'] for product in page['results']]
+            url = page['next']
+        self.assertEqual(len(ids), count)
+        self.assertEqual(set(ids), set(Product.objects.filter(name__startswith='Product').values_list('id', flat=True)))
+
+        previous = self.client.get(page['previous']).data
+        self.assertEqual([product['id'] for product in previous['results']], ids[400:800])
+
+    def test_search_index_follows_updates_and_deletes(self):
+        product = Product.objects.get(name='Orange juice')
+        product.name = 'Grapefruit juice'
+        product.save()
+        self.assertEqual(self.search('orange'), [])
+        self.assertEqual(self.search('grapefruit'), ['Grapefruit juice'])
+        product.delete()
+        self.assertEqual(self.search('grapefruit'), [])
+
+class BulkApiTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.product = Product.objects.create(name='Temporary product', price=1.99, available=True)
+        self.regular_user = User.objects.create_user(username='testuser', password='testpassword')
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client = APIClient()
+        self.token = str(AccessToken.for_user(self.admin))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_bulk_create_products(self):
+        data = [{"name": f"Bulk product {index}", "price": "2.50", "available": True} for index in range(25)]
+        response = self.client.post(reverse('product-bulk') + '?batch_size=10', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(Product.objects.filter(name__startswith='Bulk product').count(), 25)
+        self.assertEqual(
+            sorted(response.data['ids']),
+            list(Product.objects.filter(name__startswith='Bulk product').order_by('id').values_list('id', flat=True))
+        )
+
+    def test_bulk_create_reports_errors_per_item(self):
+        data = [
+            {"name": "Valid product", "price": "2.50", "available": True},
+            {"name": "", "price": "2.50", "available": True},
+        ]
+        response = self.client.post(reverse('product-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('name', response.data[1])
+        self.assertFalse(Product.objects.filter(name='Valid product').exists())
+
+    def test_bulk_create_orders_with_products(self):
+        other = Product.objects.create(name='Other product', price=3.00, available=True)
+        data = [
+            {"customer": self.customer.id, "status": "New", "products": [self.product.id, other.id]}
+            for _ in range(10)
+        ]
+        response = self.client.post(reverse('order-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 10)
+        self.assertEqual(Order.products.through.objects.count(), 20)
+
+    def test_bulk_create_orders_validates_related_ids_in_one_query(self):
+        data = [{"customer": self.customer.id, "status": "New", "products": [self.product.id]} for _ in range(10)]
+        data.append({"customer": 999, "status": "New", "products": [999]})
+        # user lookup, customers and products loaded with in_bulk()
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('order-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('customer', response.data[10])
+        self.assertIn('products', response.data[10])
+
+    def test_bulk_update_products(self):
+        second = Product.objects.create(name='Second product', price=5.00, available=True)
+        data = [{"id": self.product.id, "price": "9.99"}, {"id": second.id, "available": False}]
+        response = self.client.patch(reverse('product-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(str(self.product.price), '9.99')
+        self.assertFalse(second.available)
+
+    def test_bulk_update_unknown_id(self):
+        response = self.client.patch(reverse('product-bulk'), [{"id": 999, "price": "9.99"}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data[0])
+
+    def test_bulk_update_replaces_order_products(self):
+        order = Order.objects.create(customer=self.customer, status='New')
+        order.products.add(self.product)
+        other = Product.objects.create(name='Other product', price=3.00, available=True)
+        data = [{"id": order.id, "status": "New", "products": [other.id]}]
+        response = self.client.patch(reverse('order-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(order.products.all()), [other])
+
+    def test_updates_cannot_change_order_status(self):
+        order = Order.objects.create(customer=self.customer, status='New')
+        transition_url = reverse('order-transition', args=[order.id])
+        responses = [
+            self.client.patch(reverse('order-detail', args=[order.id]), {"status": "Sent"}, format='json'),
+            self.client.patch(reverse('order-bulk'), [{"id": order.id, "status": "Sent"}], format='json'),
+        ]
+        for response in responses:
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(transition_url, str(responses[0].data['status'][0]))
+        self.assertIn('status', responses[1].data[0])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'New')
+
+    def test_bulk_delete_customers(self):
+        other = Customer.objects.create(name='Jane Doe', address='456 Elm St')
+        response = self.client.delete(reverse('customer-bulk'), [self.customer.id, other.id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(Customer.objects.count(), 0)
+
+    def test_bulk_operations_as_regular_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.regular_user)}')
+        response = self.client.post(reverse('product-bulk'), [{"name": "x", "price": "1.00"}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_created_products_are_searchable(self):
+        data = [{"name": "Searchable gadget", "price": "2.50", "available": True}]
+        self.client.post(reverse('product-bulk'), data, format='json')
+        response = self.client.get(reverse('product-list'), {'search': 'gadget'})
+        self.assertEqual([product['name'] for product in response.data['results']], ['Searchable gadget'])
+
+class ResponseCacheApiTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.product = Product.objects.create(name='Temporary product', price=1.99, available=True)
+        self.order = Order.objects.create(customer=self.customer, status='New')
+        self.product_detail_url = reverse('product-detail', kwargs={'pk': self.product.id})
+        self.order_detail_url = reverse('order-detail', kwargs={'pk': self.order.id})
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client = APIClient()
+        self.token = str(AccessToken.for_user(self.admin))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_repeated_reads_are_served_from_cache(self):
+        first = self.client.get(self.product_detail_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.product_detail_url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+
+    def test_cache_hits_keep_the_fast_json_path(self):
+        first = self.client.get(reverse('product-list'))
+        second = self.client.get(reverse('product-list'))
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertTrue(first.plain_json)
+        self.assertTrue(second.plain_json)
+        self.assertEqual(first.content, second.content)
+
+    def test_cache_key_varies_by_query_parameters(self):
+        self.client.get(reverse('product-list'))
+        response = self.client.get(reverse('product-list'), {'page_size': 1})
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_update_invalidates_list_and_detail(self):
+        self.client.get(self.product_detail_url)
+        self.client.get(reverse('product-list'))
+        self.client.patch(self.product_detail_url, {'name': 'Renamed product'}, format='json')
+        detail = self.client.get(self.product_detail_url)
+        listing = self.client.get(reverse('product-list'))
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(detail.data['name'], 'Renamed product')
+        self.assertEqual(listing.data['results'][0]['name'], 'Renamed product')
+
+    def test_update_does_not_invalidate_other_products(self):
+        other = Product.objects.create(name='Other product', price=2.99, available=True)
+        self.client.get(self.product_detail_url)
+        other.name = 'Renamed other product'
+        other.save()
+        self.assertEqual(self.client.get(self.product_detail_url)['X-Cache'], 'HIT')
+
+    def test_order_product_changes_invalidate_order(self):
+        self.client.get(self.order_detail_url)
+        self.order.products.add(self.product)
+        response = self.client.get(self.order_detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['products'], [self.product.id])
+
+    def test_product_changes_invalidate_expanded_orders(self):
+        self.order.products.add(self.product)
+        self.client.get(self.order_detail_url, {'expand': 'products'})
+        self.product.price = 5
+        self.product.save()
+        response = self.client.get(self.order_detail_url, {'expand': 'products'})
+        self.assertEqual(response.data['products'][0]['price'], '5.00')
+
+    def test_stats_count_hits_and_misses(self):
+        before = self.client.get(reverse('response_cache_stats')).data
+        self.client.get(self.product_detail_url)
+        self.client.get(self.product_detail_url)
+        after = self.client.get(reverse('response_cache_stats')).data
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+
+class TokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Temporary product', price=1.99, available=True)
+        self.product_list_url = reverse('product-list')
+        self.product_detail_url = reverse('product-detail', kwargs={'pk': self.product.id})
+        self.regular_user = User.objects.create_user(username='testuser', password='testpassword')
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client = APIClient()
+
+    def tearDown(self):
+        # revocation markers are keyed on user ids, which later tests reuse
+        cache.clear()
+
+    def obtain_token(self, username):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': username, 'password': 'testpassword'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['access']
+
+    def test_obtained_token_carries_staff_claim(self):
+        self.assertTrue(AccessToken(self.obtain_token('testadmin'))['is_staff'])
+        self.assertFalse(AccessToken(self.obtain_token('testuser'))['is_staff'])
+
+    def test_staff_claim_authorizes_without_user_lookup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.obtain_token("testadmin")}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(self.product_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(any('auth_user' in query['sql'] for query in queries.captured_queries))
+
+    def test_staff_claim_is_enforced(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.obtain_token("testuser")}')
+        response = self.client.delete(self.product_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_token_without_staff_claim_loads_user_once(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.regular_user)}')
+        self.client.get(self.product_detail_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.product_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.obtain_token("testadmin")}')
+        self.assertEqual(self.client.get(self.product_list_url).status_code, status.HTTP_200_OK)
+        self.admin.is_active = False
+        self.admin.save()
+        self.assertEqual(self.client.get(self.product_list_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_demoted_staff_user_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.obtain_token("testadmin")}')
+        self.admin.is_staff = False
+        self.admin.save()
+        response = self.client.delete(self.product_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ExportApiTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.products = [
+            Product.objects.create(name=f'Product {index}', price='1.50', available=index % 2 == 0)
+            for index in range(3)
+        ]
+        self.orders = []
+        for index in range(5):
+            order = Order.objects.create(customer=self.customer, status='New')
+            order.products.set(self.products[:index % 3 + 1])
+            self.orders.append(order)
+        Order.objects.create(customer=self.customer, status='Pending')
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def export(self, basename, export_format, **params):
+        url = reverse(f'{basename}-export', kwargs={'export_format': export_format})
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_matches_api_representation(self):
+        response, content = self.export('order', 'ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([record['id'] for record in records], sorted(order.pk for order in Order.objects.all()))
+        for record in records:
+            detail = self.client.get(reverse('order-detail', kwargs={'pk': record['id']}))
+            self.assertEqual(record, json.loads(json.dumps(detail.data)))
+        self.assertEqual(records[-1]['products'], [])
+
+    def test_csv_has_header_and_one_row_per_object(self):
+        response, content = self.export('product', 'csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'id,name,price,available,stock')
+        self.assertEqual(lines[1], f'{self.products[0].pk},Product 0,1.50,True,')
+        self.assertEqual(len(lines), 4)
+
+        _, content = self.export('order', 'csv')
+        product_ids = ' '.join(str(product.pk) for product in self.products[:2])
+        self.assertTrue(content.splitlines()[2].endswith(f',{self.customer.pk},{product_ids}'))
+
+    def test_export_applies_search_filter(self):
+        _, content = self.export('product', 'ndjson', search='Product 2')
+        self.assertEqual([json.loads(line)['name'] for line in content.splitlines()], ['Product 2'])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_order_lines_are_loaded_once_per_chunk(self):
+        with CaptureQueriesContext(connection) as captured:
+            _, content = self.export('order', 'ndjson')
+        self.assertEqual(len(content.splitlines()), 6)
+        line_queries = [query for query in captured.captured_queries if Order.products.through._meta.db_table in query['sql']]
+        self.assertEqual(len(line_queries), 3)
+
+    def test_unknown_format_is_not_routed(self):
+        response = self.client.get('/api/orders/export/xml/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ValuesListApiTest(APITestCase):
+    def setUp(self):
+        self.customers = [
+            Customer.objects.create(name='John "Doe"', address='123 Main St'),
+            Customer.objects.create(name='Zażółć gęślą jaźń', address='Line\u2028separator\n'),
+        ]
+        self.products = [
+            Product.objects.create(name='Cheap', price='0.05'),
+            Product.objects.create(name='Dear', price='12345678.90', available=False),
+            Product.objects.create(name='Żółw', price='10'),
+            Product.objects.create(name='Refund', price='-0.50'),
+        ]
+        for index in range(5):
+            order = Order.objects.create(customer=self.customers[index % 2], status=['New', 'Sent'][index % 2])
+            order.products.add(*reversed(self.products[:index % 3 + 1]))
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def get_pages(self, url, params):
+        pages = []
+        while url:
+            cache.clear()
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.content)
+            url, params = response.data.get('next'), None
+        return pages
+
+    def assertSameAsSerializer(self, view_class, basename, **params):
+        url = reverse(f'{basename}-list')
+        pages = self.get_pages(url, params)
+        with mock.patch.object(view_class, 'use_values_list', lambda view: False):
+            self.assertEqual(pages, self.get_pages(url, params))
+        return pages
+
+    def test_products_render_identically(self):
+        pages = self.assertSameAsSerializer(ProductViewSet, 'product', page_size=2)
+        self.assertEqual(len(pages), 2)
+        self.assertIn('"price":"12345678.90"', pages[0].decode())
+        self.assertIn('"price":"-0.50"', pages[1].decode())
+        self.assertSameAsSerializer(ProductViewSet, 'product', search='Żółw', count='true')
+
+    def test_customers_render_identically(self):
+        pages = self.assertSameAsSerializer(CustomerViewSet, 'customer')
+        self.assertIn('Line\\u2028separator\\n', pages[0].decode())
+
+    def test_orders_render_identically(self):
+        pages = self.assertSameAsSerializer(OrderViewSet, 'order', page_size=2)
+        self.assertEqual(len(pages), 3)
+        self.assertRegex(pages[0].decode(), r'"date":"[^"]+Z"')
+        self.assertSameAsSerializer(OrderViewSet, 'order', ordering='date', status='Sent')
+        self.assertSameAsSerializer(OrderViewSet, 'order', expand='customer,products')
+
+    def test_order_lines_are_read_in_one_query(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(response.data['results']), 5)
+        line_queries = [query for query in captured.captured_queries if Order.products.through._meta.db_table in query['sql']]
+        self.assertEqual(len(line_queries), 1)
+        # Only the product ids are rendered, so the product table is not read.
+        self.assertFalse([query for query in captured.captured_queries if f'"{Product._meta.db_table}"' in query['sql']])
+
+
+class SparseFieldsApiTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.product = Product.objects.create(name='Product', price='2.50')
+        self.order = Order.objects.create(customer=self.customer, status='New')
+        self.order.products.add(self.product)
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def get(self, url, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        return response, [query for query in captured.captured_queries if 'auth_user' not in query['sql']]
+
+    def test_fields_trim_payload_and_columns(self):
+        response, queries = self.get(reverse('product-list'), {'fields': 'id,name,price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'id': self.product.pk, 'name': 'Product', 'price': '2.50'}])
+        self.assertNotIn('available', queries[-1]['sql'])
+
+        response, queries = self.get(reverse('product-detail', kwargs={'pk': self.product.pk}), {'omit': 'price'})
+        self.assertEqual(response.data, {'id': self.product.pk, 'name': 'Product', 'available': True, 'stock': None})
+        self.assertNotIn('price', queries[-1]['sql'])
+
+    def test_orders_skip_unrequested_relations(self):
+        url = reverse('order-detail', kwargs={'pk': self.order.pk})
+        response, queries = self.get(url, {'fields': 'id,status'})
+        self.assertEqual(response.data, {'id': self.order.pk, 'status': 'New'})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn(Customer._meta.db_table, queries[0]['sql'])
+
+        response, queries = self.get(url, {'fields': 'id,products', 'expand': 'customer,products'})
+        self.assertEqual(response.data['products'][0]['name'], 'Product')
+        self.assertEqual(set(response.data), {'id', 'products'})
+        self.assertFalse([query for query in queries if f'"{Customer._meta.db_table}"' in query['sql']])
+
+        response, queries = self.get(url, {'fields': 'customer', 'expand': 'customer'})
+        self.assertEqual(response.data, {'customer': {'id': self.customer.pk, 'name': 'John Doe', 'address': '123 Main St'}})
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.get(reverse('order-list'), {'omit': 'products', 'expand': 'customer'})
+        self.assertEqual(response.data['results'][0]['customer']['name'], 'John Doe')
+        self.assertNotIn('products', response.data['results'][0])
+        self.assertFalse([query for query in queries if Order.products.through._meta.db_table in query['sql']])
+
+    def test_list_pages_with_sparse_fields(self):
+        Order.objects.create(customer=self.customer, status='Sent')
+        response, _ = self.get(reverse('order-list'), {'fields': 'status', 'page_size': 1})
+        self.assertEqual(response.data['results'], [{'status': 'Sent'}])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'status': 'New'}])
+
+        response = self.client.get(reverse('order-export', kwargs={'export_format': 'csv'}), {'fields': 'id,products'})
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines()[:2], ['id,products', f'{self.order.pk},{self.product.pk}'])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'fields': 'Unknown fields: secret'})
+        response = self.client.get(reverse('customer-detail', kwargs={'pk': self.customer.pk}), {'omit': 'email'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductCatalogueViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = Product.objects.bulk_create([
+            Product(name=f'Product {index}', price='1.00') for index in range(5)
+        ])
+
+    @mock.patch('Lab4.views.ProductListView.paginate_by', 2)
+    def test_list_is_paginated_by_primary_key(self):
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, 'Product 1')
+        self.assertNotContains(response, 'Product 2')
+        self.assertContains(response, f'?after={self.products[1].pk}')
+        self.assertNotContains(response, '?before=')
+
+        response = self.client.get(reverse('product_list'), {'after': self.products[3].pk})
+        self.assertContains(response, 'Product 4')
+        self.assertContains(response, f'?before={self.products[4].pk}')
+        self.assertNotContains(response, '?after=')
+
+        response = self.client.get(reverse('product_list'), {'before': self.products[4].pk})
+        self.assertEqual([product.name for product in response.context['products']], ['Product 2', 'Product 3'])
+        response = self.client.get(reverse('product_list'), {'before': self.products[1].pk})
+        self.assertEqual([product.name for product in response.context['products']], ['Product 0', 'Product 1'])
+
+        response = self.client.get(reverse('product_list'), {'after': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_fragment_is_cached_until_a_product_changes(self):
+        self.client.get(reverse('product_list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('product_list'))
+        self.assertContains(response, 'Product 4')
+
+        self.products[4].name = 'Renamed'
+        self.products[4].save()
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, 'Renamed')
+
+    def test_detail_fragment_is_cached_per_product(self):
+        url = reverse('product_detail', args=[self.products[0].pk])
+        self.client.get(url)
+        # Only the lookup that decides between the page and a 404.
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        self.products[1].delete()
+        self.assertContains(self.client.get(url), 'Product 0')
+        Product.objects.filter(pk=self.products[0].pk).update(price='2.00')
+        self.assertContains(self.client.get(url), 'Price: $1.00')
+        # Queryset updates bypass the signals that bump the version.
+        Product.objects.get(pk=self.products[0].pk).save()
+        self.assertContains(self.client.get(url), 'Price: $2.00')
+
+    def test_create_form_sets_stock(self):
+        url = reverse('product_create')
+        self.assertContains(self.client.get(url), 'name="stock"')
+        response = self.client.post(url, {'name': 'Counted', 'price': '2.00', 'available': 'on', 'stock': '0'})
+        self.assertEqual(response.status_code, 302)
+        self.client.post(url, {'name': 'Uncounted', 'price': '2.00', 'available': 'on', 'stock': ''})
+        self.assertEqual(
+            dict(Product.objects.filter(name__endswith='ounted').values_list('name', 'stock')),
+            {'Counted': 0, 'Uncounted': None},
+        )
+        self.assertFalse(Product.objects.get(name='Counted').available)
+
+
+class OrderFulfilmentApiTest(APITestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name='John Doe', address='123 Main St')
+        self.available = Product.objects.create(name='In stock', price='1.00')
+        self.missing = [Product.objects.create(name=f'Missing {index}', price='1.00', available=False) for index in range(2)]
+        self.orders = [Order.objects.create(customer=customer, status=status) for status in ['New', 'New', 'Sent', 'New']]
+        self.orders[0].products.add(self.available)
+        self.orders[1].products.add(self.available, *self.missing)
+        self.orders[2].products.add(self.missing[0])
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def fulfilment(self, method, data=None, **params):
+        url = reverse('order-fulfilment')
+        if params:
+            url += '?' + '&'.join(f'{name}={value}' for name, value in params.items())
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(url, data, format='json')
+            content = b''.join(response.streaming_content).decode() if response.streaming else None
+        queries = [query for query in captured.captured_queries if 'auth_user' not in query['sql']]
+        return response, content, queries
+
+    def test_post_ids_in_one_query(self):
+        ids = [order.pk for order in self.orders] + [999999]
+        response, content, queries = self.fulfilment('post', {'ids': ids})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(queries), 1)
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(records, [
+            {'id': self.orders[0].pk, 'fulfillable': True, 'blocking_products': []},
+            {'id': self.orders[1].pk, 'fulfillable': False, 'blocking_products': [product.pk for product in self.missing]},
+            {'id': self.orders[2].pk, 'fulfillable': False, 'blocking_products': [self.missing[0].pk]},
+            {'id': self.orders[3].pk, 'fulfillable': True, 'blocking_products': []},
+        ])
+        for record, order in zip(records, self.orders):
+            self.assertEqual(record['fulfillable'], order.can_be_fulfilled())
+
+    def test_status_filter(self):
+        _, content, _ = self.fulfilment('get', status='Sent')
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.orders[2].pk])
+        _, content, _ = self.fulfilment('post', {'ids': [self.orders[0].pk, self.orders[2].pk]}, status='New')
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.orders[0].pk])
+
+    def test_requires_ids_or_filter(self):
+        response, _, _ = self.fulfilment('get')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response, _, _ = self.fulfilment('post', {'ids': ['x']})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response, _, _ = self.fulfilment('get', status='Lost')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
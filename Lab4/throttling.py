@@ -0,0 +1,126 @@
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+def get_throttle_cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    A token bucket holding `num_requests` tokens that refill evenly over the
+    rate's period, so '600/min' allows bursts of 600 and then one request
+    every 0.1s.
+
+    Each client's bucket is one integer in the cache: the time, in
+    microseconds, at which it will be full again (the GCRA "theoretical
+    arrival time"). A request adds a token's worth of time with an atomic
+    incr() and is allowed while that time is within one period from now, so
+    concurrent requests across processes cannot both take the last token.
+    The key expires once the bucket is full.
+    """
+    cache_format = 'lab4:throttle:%(scope)s:%(ident)s'
+
+    def get_rate(self):
+        # Read per request so that changes to REST_FRAMEWORK apply.
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        if self.scope not in rates:
+            return super().get_rate()
+        return rates[self.scope]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        cache = get_throttle_cache()
+        self.period = period = self.duration * 1000000
+        self.interval = interval = max(period // self.num_requests, 1)
+        now = int(self.timer() * 1000000)
+        try:
+            full_at = cache.incr(self.key, interval)
+        except ValueError:
+            full_at = now + interval
+            if not cache.add(self.key, full_at, math.ceil(interval / 1000000)):
+                full_at = cache.incr(self.key, interval)
+        else:
+            if full_at - interval < now:
+                # The bucket filled up before its key expired: the expiry
+                # is only precise to the second.
+                full_at = cache.incr(self.key, now - (full_at - interval))
+
+        self.full_in = full_at - now
+        if self.full_in > period:
+            try:
+                cache.decr(self.key, interval)
+            except ValueError:
+                pass
+            self.full_in -= interval
+            self.record(request, 0)
+            return False
+        cache.touch(self.key, math.ceil(self.full_in / 1000000))
+        self.record(request, (period - self.full_in) // interval)
+        return True
+
+    def record(self, request, remaining):
+        # Reported as X-RateLimit-* headers by RateLimitHeadersMiddleware;
+        # the throttle with the fewest tokens left is the one that counts.
+        # A Django request when called from the async views.
+        http_request = getattr(request, '_request', request)
+        current = getattr(http_request, 'rate_limit', None)
+        if current is None or remaining < current[1]:
+            http_request.rate_limit = (self.num_requests, remaining, math.ceil(self.full_in / 1000000))
+
+    def wait(self):
+        """Seconds until the bucket holds a token again."""
+        return max(self.full_in + self.interval - self.period, 0) / 1000000
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Limits each authenticated user; anonymous clients by IP address."""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    """Limits anonymous clients by IP address."""
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class ActionTokenBucketThrottle(UserTokenBucketThrottle):
+    """
+    Limits each client per endpoint. The scope is the view's `throttle_scope`
+    or, for viewsets, '<basename>.<action>' such as 'product.list'; endpoints
+    without a rate for their scope in DEFAULT_THROTTLE_RATES are not limited.
+    """
+
+    def __init__(self):
+        # The rate depends on the view, so it is looked up in allow_request().
+        pass
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, 'throttle_scope', None)
+        if self.scope is None and getattr(view, 'basename', None) and getattr(view, 'action', None):
+            self.scope = f'{view.basename}.{view.action}'
+        if self.scope not in api_settings.DEFAULT_THROTTLE_RATES:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
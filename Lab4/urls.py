@@ -1,6 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, OrderViewSet, CustomerViewSet
+from .views import (
+    ProductViewSet, OrderViewSet, CustomerViewSet, JobViewSet, ResponseCacheStatsView, SalesReportView,
+    ProductListView, ProductDetailView, ProductCreateView, metrics_view,
+)
+from .async_views import AsyncProductView, AsyncCustomerView, AsyncOrderView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -10,6 +14,7 @@ router = DefaultRouter()
 router.register('products', ProductViewSet, basename='product')
 router.register('orders', OrderViewSet, basename='order')
 router.register('customers', CustomerViewSet, basename='customer')
+router.register('jobs', JobViewSet, basename='job')
 
 schema_view = get_schema_view(
      openapi.Info(
@@ -23,8 +28,20 @@ schema_view = get_schema_view(
 )
 
 urlpatterns = [
+     path('api/cache/stats/', ResponseCacheStatsView.as_view(), name='response_cache_stats'),
+     path('api/reports/sales/', SalesReportView.as_view(), name='sales_report'),
+     path('api/async/products/', AsyncProductView.as_view(), name='async-product-list'),
+     path('api/async/products/<int:pk>/', AsyncProductView.as_view(), name='async-product-detail'),
+     path('api/async/customers/', AsyncCustomerView.as_view(), name='async-customer-list'),
+     path('api/async/customers/<int:pk>/', AsyncCustomerView.as_view(), name='async-customer-detail'),
+     path('api/async/orders/', AsyncOrderView.as_view(), name='async-order-list'),
+     path('api/async/orders/<int:pk>/', AsyncOrderView.as_view(), name='async-order-detail'),
      path('api/', include(router.urls)),
      path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
      path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
      path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+     path('metrics', metrics_view, name='metrics'),
+     path('products/', ProductListView.as_view(), name='product_list'),
+     path('products/create/', ProductCreateView.as_view(), name='product_create'),
+     path('products/<int:pk>/', ProductDetailView.as_view(), name='product_detail'),
 ]
\ No newline at end of file
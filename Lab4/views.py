@@ -1,44 +1,203 @@
-from .models import Product, Customer, Order
-from rest_framework import viewsets
-from .serializers import ProductSerializer, CustomerSerializer, OrderSerializer
-from rest_framework.permissions import IsAuthenticated
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Product, Customer, Order, DailySales, ProductSales, Job
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from .serializers import (
+    ProductSerializer, CustomerSerializer, OrderSerializer, OrderFulfilmentSerializer, OrderTransitionSerializer,
+    JobSerializer, DailySalesSerializer, SalesTotalSerializer, StatusSalesSerializer, ProductSalesSerializer, SalesReportQuerySerializer,
+)
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from .permissions import IsAdminOrReadOnly
 from django.views.generic import ListView, DetailView, CreateView
 from .forms import ProductForm
-from rest_framework.filters import SearchFilter
+from .filters import ProductSearchFilter, OrderFilter, OrderFilterSerializer, OrderDateOrderingFilter
+from .pagination import IdCursorPagination, KeysetPage, OrderCursorPagination
+from .export import stream_fulfilment
+from .mixins import BulkModelMixin, CachedResponseMixin, ExportMixin, SparseFieldsMixin, ValuesListMixin
+from .cache import get_response_cache_timeout, get_versions, response_cache_stats, version_key
+from .metrics import render_metrics
+from .jobs import enqueue
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(
+    CachedResponseMixin, SparseFieldsMixin, ValuesListMixin, BulkModelMixin, ExportMixin, viewsets.ModelViewSet
+):
   permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
 
   queryset = Product.objects.all()
   serializer_class = ProductSerializer
+  pagination_class = IdCursorPagination
 
-  filter_backends = (SearchFilter,)
+  filter_backends = (ProductSearchFilter,)
   search_fields = ['name']
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(
+    CachedResponseMixin, SparseFieldsMixin, ValuesListMixin, BulkModelMixin, ExportMixin, viewsets.ModelViewSet
+):
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
 
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    pagination_class = IdCursorPagination
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(
+    CachedResponseMixin, SparseFieldsMixin, ValuesListMixin, BulkModelMixin, ExportMixin, viewsets.ModelViewSet
+):
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
 
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related('customer').prefetch_related(
+        Prefetch('products', queryset=Product.objects.order_by('pk'))
+    )
     serializer_class = OrderSerializer
+    pagination_class = OrderCursorPagination
+    cache_dependencies = (Customer, Product)
 
-class ProductListView(ListView):
+    filter_backends = (OrderDateOrderingFilter, OrderFilter)
+    ordering = ('-date', '-id')
+
+    def get_expand(self):
+        expand = self.request.query_params.get('expand', '') if self.request else ''
+        fields = {field.strip() for field in expand.split(',') if field.strip()}
+        unknown = fields - set(OrderSerializer.EXPANDABLE_FIELDS)
+        if unknown:
+            raise ValidationError({'expand': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+    def use_values_list(self):
+        return not self.get_expand()
+
+    @action(
+        detail=False, methods=['get', 'post'], permission_classes=[IsAuthenticated],
+        serializer_class=OrderFulfilmentSerializer,
+    )
+    def fulfilment(self, request):
+        """
+        Streams, as NDJSON, whether each order can be fulfilled and which
+        unavailable products block it, for the order `ids` POSTed and/or the
+        orders matching the list filters (`?status=`, `?customer=`, dates).
+        """
+        params = OrderFulfilmentSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        filtered = set(OrderFilterSerializer().fields) & set(request.query_params)
+        if 'ids' not in params.validated_data and not filtered:
+            raise ValidationError({'non_field_errors': ['Give order ids or a filter such as ?status=.']})
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+        if 'ids' in params.validated_data:
+            queryset = queryset.filter(pk__in=params.validated_data['ids'])
+        return StreamingHttpResponse(stream_fulfilment(queryset), content_type='application/x-ndjson')
+
+    @action(detail=True, methods=['post'], serializer_class=OrderTransitionSerializer)
+    def transition(self, request, pk=None):
+        """
+        Queues moving the order to the next `status` and answers 202 with the
+        job, which `manage.py process_jobs` runs.
+        """
+        order = self.get_object()
+        params = OrderTransitionSerializer(data=request.data, context={'order': order})
+        params.is_valid(raise_exception=True)
+        job = enqueue('order.transition', {'order': order.pk, 'status': params.validated_data['status']})
+        return Response(
+            JobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('job-detail', args=[job.pk])},
+        )
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    permission_classes = [IsAdminUser]
+
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    pagination_class = IdCursorPagination
+
+class ResponseCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache_stats())
+
+class SalesReportView(APIView):
+    """
+    Orders and revenue by status and day, and the best-selling products, read
+    from the incrementally maintained DailySales and ProductSales tables.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        query = SalesReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        daily = DailySales.objects.all()
+        if 'start' in params:
+            daily = daily.filter(day__gte=params['start'])
+        if 'end' in params:
+            daily = daily.filter(day__lte=params['end'])
+        if 'status' in params:
+            daily = daily.filter(status=params['status'])
+        sums = {
+            'orders': Coalesce(Sum('orders'), 0),
+            'revenue': Coalesce(Sum('revenue'), Value(Decimal('0.00'))),
+        }
+        top_products = (
+            ProductSales.objects.filter(units__gt=0).select_related('product')
+            .order_by('-units', 'product_id')[:params['top']]
+        )
+        return Response({
+            'totals': SalesTotalSerializer(daily.aggregate(**sums)).data,
+            'by_status': StatusSalesSerializer(
+                daily.values('status').annotate(**sums).order_by('status'), many=True
+            ).data,
+            'by_day': DailySalesSerializer(daily.order_by('day', 'status'), many=True).data,
+            'top_products': ProductSalesSerializer(top_products, many=True).data,
+        })
+
+def metrics_view(request):
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class FragmentCacheMixin:
+  # Context for the templates' {% cache %} fragments, which are stored with
+  # the cached API responses and keyed on the same version counters.
+  def get_cache_versions(self):
+    return [version_key(None), version_key(self.model)]
+
+  def get_context_data(self, **kwargs):
+    context = super().get_context_data(**kwargs)
+    context['cache_alias'] = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+    context['cache_timeout'] = get_response_cache_timeout()
+    context['cache_version'] = '-'.join(get_versions(self.get_cache_versions()))
+    return context
+
+class ProductListView(FragmentCacheMixin, ListView):
   model = Product
   template_name = 'product_list.html'
   context_object_name = 'products'
+  paginate_by = 50
 
-class ProductDetailView(DetailView):
+  def paginate_queryset(self, queryset, page_size):
+    # Pages are read lazily, inside the cached fragment.
+    page = KeysetPage(queryset, page_size, self.request.GET)
+    return None, page, page, True
+
+class ProductDetailView(FragmentCacheMixin, DetailView):
   model = Product
   template_name = 'product_detail.html'
   context_object_name = 'product'
 
+  def get_cache_versions(self):
+    return [version_key(None), version_key(self.model, self.object.pk)]
+
 class ProductCreateView(CreateView):
   model = Product
   form_class = ProductForm
@@ -0,0 +1,15 @@
+"""
+Set-up for the `process_jobs --pool process` worker processes. Spawned
+workers import this module before Django is set up, so it must not import
+models.
+"""
+import django
+from django.db import connections
+
+
+def setup_worker_process(database_names):
+    django.setup()
+    # Connect to the databases the parent uses, which can differ from the
+    # settings module's (the test runner renames them, for one).
+    for alias, name in database_names.items():
+        connections[alias].settings_dict['NAME'] = name
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import copy
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Lab4.middleware.RequestTimingMiddleware',
+    'Lab4.middleware.ReplicaRoutingMiddleware',
+    'Lab4.middleware.RateLimitHeadersMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +57,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Fraction of requests timed by RequestTimingMiddleware; 0 removes it from
+# the stack entirely.
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', '0'))
+
 ROOT_URLCONF = 'Lab4_Django.urls'
 
 TEMPLATES = [
@@ -59,8 +68,15 @@ TEMPLATES = [
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory; development servers
+            # still pick up edits, which reset the cache.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -77,17 +93,54 @@ WSGI_APPLICATION = 'Lab4_Django.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds and checked
+# before reuse. Setting DATABASE_POOL=true switches to a psycopg 3 connection
+# pool instead, which also suits ASGI, where persistent per-thread
+# connections are not reused reliably.
+
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'false').lower() in ('1', 'true', 'yes')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'SE_labs',
-        'USER': 'Marcin',
-        'PASSWORD': 'siema123',
-        'HOST': 'db',
-        'PORT': 5432,
+        'NAME': os.environ.get('DATABASE_NAME', 'SE_labs'),
+        'USER': os.environ.get('DATABASE_USER', 'Marcin'),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', 'siema123'),
+        'HOST': os.environ.get('DATABASE_HOST', 'db'),
+        'PORT': int(os.environ.get('DATABASE_PORT', '5432')),
+        'CONN_MAX_AGE': 0 if DATABASE_POOL else int(os.environ.get('DATABASE_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.environ.get('DATABASE_CONN_HEALTH_CHECKS', 'true').lower() in ('1', 'true', 'yes'),
+        'OPTIONS': {},
     }
 }
 
+if DATABASE_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', '10')),
+        'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', '10')),
+    }
+
+# Read replicas, as comma-separated hosts in DATABASE_REPLICA_HOSTS, become
+# the aliases replica_1, replica_2, ... with the primary's other settings.
+# Safe-method API requests read from them (Lab4.routers.ReplicaRouter), except
+# for clients that wrote within the last REPLICA_PIN_SECONDS, which should
+# exceed the replication lag. Writes, migrations and the admin always use the
+# primary. Share the 'default' cache between processes so pins are too.
+
+for index, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'OPTIONS': copy.deepcopy(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['Lab4.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', '5'))
+REPLICA_READ_PATHS = ('/api/',)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -108,6 +161,28 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Point 'default' at Redis or Memcached to share cached API responses
+# between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Holds the API throttles' token buckets; must be shared between processes
+# and support atomic incr(), as Redis and Memcached do.
+THROTTLE_CACHE_ALIAS = 'default'
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -132,10 +207,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'Lab4.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'Lab4.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'Lab4.pagination.IdCursorPagination',
+    'PAGE_SIZE': 50,
+    # Token buckets: 'N/period' allows bursts of N requests, refilled evenly
+    # over the period. Per-endpoint scopes are '<basename>.<action>'.
+    'DEFAULT_THROTTLE_CLASSES': [
+        'Lab4.throttling.AnonTokenBucketThrottle',
+        'Lab4.throttling.UserTokenBucketThrottle',
+        'Lab4.throttling.ActionTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '120/min',
+        'user': '3000/min',
+        'product.list': '600/min',
+        'order.fulfilment': '60/min',
+    },
+}
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'Lab4.serializers.StaffClaimTokenObtainPairSerializer',
 }
 
+# Verified tokens are kept in a per-process LRU for at most this many seconds.
+JWT_AUTH_CACHE_TTL = 60
+JWT_AUTH_CACHE_SIZE = 10000
+
+# Rows written per INSERT/UPDATE statement by the bulk API endpoints.
+BULK_BATCH_SIZE = 1000
+
+# Rows read per query by the streaming CSV/NDJSON exports.
+EXPORT_CHUNK_SIZE = 2000
+
+# Background jobs (Lab4.jobs), run by `manage.py process_jobs`. A failed job
+# runs again after JOB_RETRY_DELAY seconds, doubling up to JOB_RETRY_MAX_DELAY,
+# until it has made JOB_MAX_ATTEMPTS attempts. A job left running for
+# JOB_LOCK_TIMEOUT seconds is taken to have lost its worker and is requeued.
+JOB_WORKERS = 4
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 5
+JOB_RETRY_MAX_DELAY = 300
+JOB_LOCK_TIMEOUT = 600